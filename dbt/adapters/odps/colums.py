@@ -1,10 +1,42 @@
+import re
 from dataclasses import dataclass
-from typing import Any
+from typing import Any, Optional, Tuple
 
 from dbt.adapters.base.column import Column
 from odps.models.table import TableSchema
 from odps.types import Decimal, Varchar
 
+_TYPE_PATTERN = re.compile(r"^\s*(\w+)\s*(?:\(\s*(\d+)\s*(?:,\s*(\d+)\s*)?\))?\s*$")
+# each type can be widened to the types after it
+_INTEGER_TYPES = ["tinyint", "smallint", "int", "bigint"]
+_FLOAT_TYPES = ["float", "double"]
+
+
+def _parse_type(dtype: str) -> Tuple[str, Optional[int], Optional[int]]:
+    find = _TYPE_PATTERN.match(dtype or "")
+    if not find:
+        return (dtype or "").strip().lower(), None, None
+    name, size, scale = find.groups()
+    return name.lower(), int(size) if size else None, int(scale) if scale else None
+
+
+def is_widening(from_dtype: str, to_dtype: str) -> bool:
+    """Whether every value of `from_dtype` fits `to_dtype`, so the column type can be changed in place"""
+    from_name, from_size, from_scale = _parse_type(from_dtype)
+    to_name, to_size, to_scale = _parse_type(to_dtype)
+    for family in (_INTEGER_TYPES, _FLOAT_TYPES):
+        if from_name in family and to_name in family:
+            return family.index(from_name) <= family.index(to_name)
+    if from_name == "decimal" and to_name == "decimal":
+        if from_size is None or from_scale is None or to_size is None or to_scale is None:
+            return from_size == to_size and from_scale == to_scale
+        return to_scale >= from_scale and to_size - to_scale >= from_size - from_scale
+    if from_name in ("char", "varchar", "string") and to_name == "string":
+        return True
+    if from_name in ("char", "varchar") and to_name == "varchar":
+        return from_size is not None and to_size is not None and to_size >= from_size
+    return False
+
 
 @dataclass
 class OdpsColumn(Column):
@@ -33,6 +65,9 @@ class OdpsColumn(Column):
         else:
             return "{}({},{})".format("decimal", precision, scale)
 
+    def can_widen_to(self, dtype: str) -> bool:
+        return is_widening(self.dtype, dtype)
+
     def __repr__(self) -> str:
         return "<OdpsColumn {} ({})>".format(self.name, self.data_type)
 
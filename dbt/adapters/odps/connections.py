@@ -1,15 +1,32 @@
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
-from dataclasses import dataclass
-from typing import Optional, Dict, Union
+from dataclasses import dataclass, field
+from typing import Any, Hashable, List, Optional, Dict, Union, cast
 
+import agate
 import dbt.exceptions
 from dbt.adapters.base import Credentials
+from dbt.clients import agate_helper
 from dbt.adapters.sql import SQLConnectionManager
 # from dbt.logger import GLOBAL_LOGGER as logger
 from dbt.contracts.connection import AdapterResponse, ConnectionState, AdapterRequiredConfig
 
 from dbt.adapters.odps.utils import print_method_call, logger
-from .dbapi import ODPSConnection
+from .dbapi import ODPSConnection, QueryOptions, TableSizes
+from .script import SqlScript
+from .throttle import AdaptiveThrottle
+from .registry import RUNNING_INSTANCES
+from .retry import DEFAULT_RETRY_ERRORS, RetryPolicy
+from .scheduling import DEFAULT_PRIORITY, critical_path_priorities, load_child_map
+
+
+@dataclass
+class OdpsAdapterResponse(AdapterResponse):
+    instance_ids: List[str] = field(default_factory=list)
+    partitions: Optional[List[str]] = None
+    # buffered into a script that has not been submitted yet
+    deferred: bool = False
+
 
 @dataclass
 class ODPSCredentials(Credentials):
@@ -24,6 +41,22 @@ class ODPSCredentials(Credentials):
     secret_access_key: str
     priority: Optional[int] = None
     hints: Optional[Dict[str, str]] = None
+    submit_mode: Optional[str] = None
+    auto_priority: bool = False
+    max_concurrent_statements: Optional[int] = None
+    queue_wait_threshold: float = 30.0
+    skip_unchanged: bool = False
+    download_threads: int = 4
+    test_batch_window: float = 0
+    test_batch_size: int = 50
+    interactive: str = "off"
+    interactive_max_input_mb: float = 1024
+    interactive_fallback_policy: str = "all"
+    statement_retries: int = 0
+    retry_backoff: float = 5.0
+    retry_max_elapsed: float = 1800.0
+    retry_errors: Optional[List[str]] = None
+    query_timeout: Optional[float] = None
 
     _ALIASES = {"ak": "access_id", "sk": "secret_access_key"}
 
@@ -55,6 +88,23 @@ class ODPSConnectionManager(SQLConnectionManager):
         # profile.query_comment.comment = None
 
         super().__init__(profile)
+        self.thread_query_options: Dict[Hashable, QueryOptions] = {}
+        self._node_priorities: Optional[Dict[str, int]] = None
+        # one throttle for all threads, statements of every model compete for the same quota
+        credentials = self.credentials
+        self.throttle: Optional[AdaptiveThrottle] = None
+        self.retry_policy = RetryPolicy(
+            retries=credentials.statement_retries,
+            backoff=credentials.retry_backoff,
+            max_elapsed=credentials.retry_max_elapsed,
+            errors=list(credentials.retry_errors or DEFAULT_RETRY_ERRORS),
+        )
+        # sizes of the tables selects read, for `auto` query acceleration routing
+        self.table_sizes = TableSizes() if credentials.interactive == "auto" else None
+        if credentials.max_concurrent_statements:
+            self.throttle = AdaptiveThrottle(
+                credentials.max_concurrent_statements, credentials.queue_wait_threshold
+            )
 
     @contextmanager
     def exception_handler(self, sql):
@@ -90,7 +140,7 @@ class ODPSConnectionManager(SQLConnectionManager):
         #logger.debug(f"open credentials: {credentials}")
 
         try:
-            hints = credentials.hints or {}
+            hints = dict(credentials.hints or {})
             hints["odps.namespace.schema"] = "true"
 
             kwargs = dict(
@@ -99,7 +149,8 @@ class ODPSConnectionManager(SQLConnectionManager):
                 secret_access_key=credentials.secret_access_key,
                 project=credentials.database,
                 priority = credentials.priority,
-                hints=hints
+                hints=hints,
+                fallback_policy=credentials.interactive_fallback_policy,
             )
            
             
@@ -127,13 +178,121 @@ class ODPSConnectionManager(SQLConnectionManager):
 
         return connection
 
+    @property
+    def credentials(self) -> ODPSCredentials:
+        return cast(ODPSCredentials, self.profile.credentials)
+
+    def set_query_options(self, node: Any = None) -> None:
+        """Take the per-model `hints`, `priority`, `interactive` and `query_timeout` of the node run on this thread"""
+        key = self.get_thread_identifier()
+        config = getattr(node, "config", None)
+        if config is None:
+            self.thread_query_options.pop(key, None)
+            return
+        priority = config.get("priority")
+        if priority is None and self.credentials.auto_priority:
+            priority = self.node_priorities.get(getattr(node, "unique_id", ""))
+        self.thread_query_options[key] = QueryOptions(
+            hints=dict(config.get("hints") or {}),
+            priority=priority,
+            interactive=config.get("interactive"),
+            query_timeout=config.get("query_timeout"),
+        )
+
+    @property
+    def node_priorities(self) -> Dict[str, int]:
+        """Priorities from the manifest's critical paths, models blocking more downstream work run first"""
+        with self.lock:
+            if self._node_priorities is None:
+                credentials = self.credentials
+                lowest = credentials.priority if credentials.priority is not None else DEFAULT_PRIORITY
+                # the profile is the runtime config here, AdapterRequiredConfig doesn't declare its target path
+                child_map = load_child_map(getattr(self.profile, "project_target_path"))
+                self._node_priorities = critical_path_priorities(child_map, lowest=lowest)
+            return self._node_priorities
+
+    def _prepare_handle(self, connection) -> ODPSConnection:
+        handle: ODPSConnection = connection.handle
+        options = self.thread_query_options.get(self.get_thread_identifier())
+        handle.options = options or QueryOptions()
+        handle.throttle = self.throttle
+        handle.retry_policy = self.retry_policy
+        handle.query_timeout = self.credentials.query_timeout
+        handle.download_threads = self.credentials.download_threads
+        handle.interactive = self.credentials.interactive
+        handle.interactive_max_input_bytes = self.credentials.interactive_max_input_mb * 1024 * 1024
+        handle.table_sizes = self.table_sizes
+        return handle
+
+    def add_query(self, sql, auto_begin=True, bindings=None, abridge_sql_log=False):
+        self._prepare_handle(self.get_thread_connection())
+        return super().add_query(sql, auto_begin, bindings, abridge_sql_log)
+
+    def execute_many(
+        self,
+        sqls: List[str],
+        concurrency: int = 4,
+        retries: int = 0,
+        return_exceptions: bool = False,
+        fetch: bool = False,
+    ) -> List[Any]:
+        """
+        Run independent statements of the current model as concurrent instances,
+        each one is retried up to `retries` times when it fails.
+        With `fetch`, each result is the (response, table) pair `execute` returns.
+        """
+        handle = self._prepare_handle(self.get_thread_connection())
+
+        def run(sql):
+            for attempt in range(retries + 1):
+                logger.debug(f"Running concurrent statement (attempt {attempt + 1}):\n{sql}")
+                try:
+                    with self.exception_handler(sql):
+                        cursor = handle.cursor()
+                        cursor.execute(sql)
+                        response = self.get_response(cursor)
+                        return (response, self.get_result_from_cursor(cursor, None)) if fetch else response
+                except dbt.exceptions.DbtRuntimeError:
+                    if attempt == retries:
+                        raise
+
+        # concurrent statements are never buffered into a script
+        with handle.script_suspended():
+            with ThreadPoolExecutor(max_workers=max(int(concurrency), 1)) as executor:
+                futures = [executor.submit(run, sql) for sql in sqls]
+        # every statement has finished here
+        if return_exceptions:
+            return [future.exception() or future.result() for future in futures]
+        return [future.result() for future in futures]
+
+    def submit(self, sql: str) -> str:
+        """Start the statement as an instance of the current model and return its id without waiting"""
+        handle = self._prepare_handle(self.get_thread_connection())
+        with self.exception_handler(sql):
+            instance = handle.cursor().submit(sql)
+        logger.debug(f"Submitted instance {instance.id}:\n{sql}")
+        return instance.id
+
     @classmethod
     @print_method_call
     def get_response(cls, cursor) -> AdapterResponse:
         # ODPS does not support cursor and rowcount
         # https://github.com/dbt-labs/dbt-spark/issues/142
+        if getattr(cursor, "deferred", False):
+            return OdpsAdapterResponse(_message="DEFERRED", deferred=True)
         message = "OK"
-        return AdapterResponse(_message=message)
+        instance = getattr(cursor, "_instance", None)
+        return OdpsAdapterResponse(_message=message, instance_ids=[instance.id] if instance else [])
+
+    @classmethod
+    def get_result_from_cursor(cls, cursor: Any, limit: Optional[int]) -> agate.Table:
+        # rows stream from the instance tunnel, the limit bounds what is downloaded
+        data: List[Any] = []
+        column_names: List[str] = []
+        if cursor.description is not None:
+            column_names = [col[0] for col in cursor.description]
+            data = cls.process_results(column_names, cursor.iter_rows(limit or None))
+        return agate_helper.table_from_data_flat(data, column_names)
 
     @classmethod
     @print_method_call
@@ -153,5 +312,66 @@ class ODPSConnectionManager(SQLConnectionManager):
     def rollback(self, *args, **kwargs):
         logger.debug("Not Supported: rollback")
 
+    def begin_script(self):
+        self.get_thread_connection().handle.begin_script()
+
+    def flush_script(self):
+        connection = self.get_if_exists()
+        if connection is None or connection.state != ConnectionState.OPEN:
+            return
+        with self.exception_handler("<script>"):
+            connection.handle.flush_script()
+
+    def end_script(self):
+        with self.exception_handler("<script>"):
+            self.get_thread_connection().handle.end_script()
+
+    def execute_script(self, sqls: List[str]) -> OdpsAdapterResponse:
+        """
+        Submit the statements as one script instance, so they succeed or fail together.
+        When the model is already buffering a script they simply join it.
+        """
+        script = SqlScript()
+        for sql in sqls:
+            script.add(sql)
+        handle = self._prepare_handle(self.get_thread_connection())
+        with self.exception_handler(script.render()):
+            if handle.script is not None:
+                if not handle.script.accepts():
+                    handle.flush_script()
+                for statement in script.statements:
+                    handle.script.add(statement)
+                return OdpsAdapterResponse(_message="DEFERRED", deferred=True)
+            logger.debug(f"Running script:\n{script.render()}")
+            cursor = handle.cursor()
+            cursor.execute_script(script)
+            return self.get_response(cursor)
+
     def cancel(self, connection):
-        connection.handle.cancel()
+        background = RUNNING_INSTANCES.background(connection.handle)
+        self._report_cancelled(*connection.handle.cancel(), background=background)
+
+    def cancel_open(self) -> List[str]:
+        """
+        Stop every instance this process still runs, in parallel, on Ctrl-C or `--fail-fast`.
+        Instances of released connections and of concurrent statements are stopped too.
+        """
+        this_connection = self.get_if_exists()
+        with self.lock:
+            names = [
+                connection.name
+                for connection in self.thread_connections.values()
+                if connection is not this_connection and connection.name is not None
+            ]
+        background = RUNNING_INSTANCES.background()
+        self._report_cancelled(*RUNNING_INSTANCES.stop_all(), background=background)
+        return names
+
+    @staticmethod
+    def _report_cancelled(stopped: List[str], failed: List[str], background: Optional[List[str]] = None):
+        if stopped:
+            submitted = [instance_id for instance_id in stopped if instance_id in (background or [])]
+            detail = f" ({len(submitted)} submitted in the background)" if submitted else ""
+            logger.info(f"Stopped {len(stopped)} running ODPS instances{detail}: {', '.join(stopped)}")
+        if failed:
+            logger.warning(f"Failed to stop {len(failed)} ODPS instances: {', '.join(failed)}")
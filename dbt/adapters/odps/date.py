@@ -107,6 +107,41 @@ def parse_date(datestr: str) -> LocalDate:
     else:   # iso date
         return LocalDate(datetime.fromisoformat(datestr))
 
+
+def batch_ranges(begin, end, batch_size="day"):
+    """
+    Split [begin, end) into batches of a day, week or month, as (start, end) LocalDate pairs.
+    Batches break at the start of each day, week or month, the first one starts at `begin`
+    and the last one stops at `end`, so no batch reaches outside the range.
+
+    :type begin: LocalDate | str
+    :type end: LocalDate | str
+    """
+    steps = {
+        "day": (lambda d: d, lambda d: d.add_days()),
+        "week": (lambda d: d.start_of_week(), lambda d: d.add_weeks()),
+        "month": (lambda d: d.start_of_month(), lambda d: d.add_months()),
+    }
+    if batch_size not in steps:
+        raise ValueError(f"Invalid batch size {batch_size}, expected one of day, week, month")
+    align, step = steps[batch_size]
+
+    def midnight(d):
+        d = d if isinstance(d, LocalDate) else parse_date(str(d))
+        return LocalDate(d.date.replace(hour=0, minute=0, second=0, microsecond=0))
+
+    start = midnight(begin)
+    end = midnight(end)
+    ranges = []
+    while start.date < end.date:
+        stop = step(align(start))
+        if stop.date > end.date:
+            stop = end
+        ranges.append((start, stop))
+        start = stop
+    return ranges
+
+
 def local(date) -> LocalDate:
     """
     Jinjia2 filter for date
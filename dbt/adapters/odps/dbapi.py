@@ -1,11 +1,82 @@
+import itertools
 import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field
+from typing import Deque, Dict, Optional
 
 from odps.compat import six
 from odps.dbapi import Connection, Cursor
-from odps.errors import ODPSError
+from odps.errors import NoSuchObject, ODPSError, WaitTimeoutError
+from odps.models import Instance
 from odps.utils import to_str
 
-from dbt.adapters.odps.utils import print_method_call, logger, parse_hints, remove_comments
+from dbt.adapters.odps.errors import ScriptStatementError, QueryTimeoutError
+from dbt.adapters.odps.registry import RUNNING_INSTANCES
+from dbt.adapters.odps.retry import RetryPolicy
+from dbt.adapters.odps.script import SqlScript, SCRIPT_MODE_HINTS
+from dbt.adapters.odps.utils import (
+    print_method_call, logger, parse_hints, remove_comments, is_query, is_select, is_idempotent, format_hints,
+)
+
+POLL_INTERVAL = 1
+# results larger than one block are downloaded block by block, possibly in parallel
+DOWNLOAD_BLOCK_ROWS = 100000
+
+
+@dataclass
+class QueryOptions:
+    """Settings of the model being run, applied to its statements only"""
+    hints: Dict[str, str] = field(default_factory=dict)
+    priority: Optional[int] = None
+    interactive: Optional[bool] = None
+    query_timeout: Optional[float] = None
+
+
+# tables a query reads: names after `from` and `join`, subqueries aside
+_READ_TABLES = re.compile(r"\b(?:from|join)\s+([`\w.]+)", re.IGNORECASE)
+
+
+class TableSizes(object):
+    """Sizes of the tables queries read, looked up once per run"""
+
+    def __init__(self):
+        self._sizes: Dict[str, Optional[int]] = {}
+        self._lock = threading.Lock()
+
+    def input_size(self, odps, sql: str) -> Optional[int]:
+        """Bytes of the tables the query reads, none when one of them is a view or can't be looked up"""
+        total = 0
+        for name in {name.replace("`", "").lower() for name in _READ_TABLES.findall(sql)}:
+            with self._lock:
+                known = name in self._sizes
+                size = self._sizes.get(name)
+            if not known:
+                size = self._lookup(odps, name)
+                with self._lock:
+                    self._sizes[name] = size
+            if size is None:
+                return None
+            total += size
+        return total
+
+    @staticmethod
+    def _lookup(odps, name: str) -> Optional[int]:
+        try:
+            table = odps.get_table(name)
+            table.reload()
+        except NoSuchObject:
+            # common table expressions are read through the tables they select from
+            return 0
+        except ODPSError as e:
+            logger.debug(f"No size of {name}: {e}")
+            return None
+        if table.is_virtual_view or table.size is None:
+            return None
+        return table.size
 
 
 class ODPSCursor(Cursor):
@@ -15,11 +86,14 @@ class ODPSCursor(Cursor):
         self._priority  = None
         if 'priority' in  kwargs:
             self._priority = kwargs['priority']
+        # the last statement was buffered into the connection's script and has not run yet
+        self.deferred = False
          
     @print_method_call
     def execute(self, operation, parameters=None, **kwargs):
         # prepare statement
         sql = remove_comments(operation)
+        sql_hints, sql = parse_hints(sql)
         if parameters:
             for origin, replacement in parameters.items():
                 if isinstance(replacement, six.string_types):
@@ -30,17 +104,142 @@ class ODPSCursor(Cursor):
                 sql = re.sub(pattern_str, replacement_str, to_str(sql))
 
         self._reset_state()
+        self.deferred = False
+        script = self._connection.script
+        if script is not None:
+            if not is_query(sql):
+                hints = format_hints(sql_hints)
+                if not script.accepts(hints):
+                    # `set` lines only apply to their own statement, the buffer goes first
+                    self._connection.flush_script()
+                script.add(sql, hints)
+                self.deferred = True
+                return
+            # queries need their result now, so everything buffered before them goes first
+            self._connection.flush_script()
+        self._run_with_retries(sql, self._statement_hints(sql_hints))
+
+    def execute_script(self, script: SqlScript):
+        hints = self._statement_hints(script.hints)
+        hints.update(SCRIPT_MODE_HINTS)
+        self._reset_state()
+        try:
+            self._run(script.render(), hints)
+        except ODPSError as e:
+            raise ScriptStatementError(str(e), script.locate(str(e))) from e
+
+    def submit(self, sql):
+        """
+        Start the statement and return its instance without waiting for it.
+        Until it finishes, it holds a throttle slot and stays registered, watched from a daemon thread.
+        """
+        connection, throttle = self._connection, self._connection.throttle
+        if throttle:
+            throttle.acquire()
+        try:
+            instance = connection.odps.run_sql(sql, hints=self._statement_hints(), priority=self._statement_priority)
+        except BaseException:
+            if throttle:
+                throttle.release()
+            raise
+        RUNNING_INSTANCES.add(connection, instance, background=True)
+        threading.Thread(target=self._watch_submitted, args=(connection, instance, throttle), daemon=True).start()
+        return instance
+
+    @classmethod
+    def _watch_submitted(cls, connection, instance, throttle):
+        queue_seconds = None
+        try:
+            queue_seconds = cls._wait_for_instance(instance, track_queue=throttle is not None)
+        except Exception as e:
+            logger.debug(f"Submitted instance {instance.id} failed: {e}")
+        finally:
+            RUNNING_INSTANCES.discard(connection, instance)
+            if throttle:
+                throttle.release(queue_seconds)
+
+    def _statement_hints(self, sql_hints=None):
+        # global hints < model hints < `set` lines of the statement itself
+        hints = dict(self._hints or {})
+        hints.update(format_hints(self._connection.options.hints))
+        hints.update(format_hints(sql_hints))
+        return hints
+
+    @property
+    def _statement_priority(self):
+        if self._connection.options.priority is not None:
+            return self._connection.options.priority
+        return self._priority
+
+    @property
+    def _statement_timeout(self) -> Optional[float]:
+        # a model setting of 0 lifts the profile's timeout
+        timeout = self._connection.options.query_timeout
+        if timeout is None:
+            timeout = self._connection.query_timeout
+        return timeout or None
+
+    def _run_with_retries(self, sql, hints):
+        """Resubmit idempotent statements failing with a transient error, per the connection's retry policy"""
+        policy = self._connection.retry_policy
+        if not policy.retries or not is_idempotent(sql):
+            return self._run(sql, hints)
+        started = time.time()
+        for attempt in itertools.count():
+            try:
+                return self._run(sql, hints)
+            except Exception as e:
+                delay = policy.next_delay(e, attempt, time.time() - started)
+                if delay is None or not self._stop_failed_attempt():
+                    raise
+                logger.warning(f"Transient error, resubmitting the statement in {delay:.0f}s (retry {attempt + 1}): {e}")
+                self._reset_state()
+                time.sleep(delay)
+
+    def _stop_failed_attempt(self) -> bool:
+        """
+        Make sure the instance of a failed attempt no longer runs, so its resubmission doesn't run next to it:
+        an error while polling leaves it running. False when that can't be told.
+        """
+        instance = self._instance
+        if instance is None:
+            return True
+        try:
+            if not instance.is_terminated():
+                logger.debug(f"Stopping instance {instance.id} of the failed attempt")
+                instance.stop()
+        except Exception as e:
+            logger.warning(f"Failed to stop instance {instance.id}, not resubmitting the statement: {e}")
+            # cancelling the run can still reach it
+            RUNNING_INSTANCES.add(self._connection, instance, background=True)
+            return False
+        return True
+
+    def _run(self, sql, hints):
         odps = self._connection.odps
         run_sql = odps.run_sql
+        interactive = False
         if self._use_sqa:
             run_sql = self._run_sqa_with_fallback
+        elif self._route_interactive(sql):
+            run_sql, interactive = self._run_interactive, True
         #logger.debug(f"ODPSCursor.execute  sql: {sql}")
 
+        throttle = self._connection.throttle
         try:
-            self._instance = run_sql(sql, hints= self._hints, priority = self._priority)
-            logger.debug(f"""instance log url: {self._instance.get_logview_address()}""")
-            self._instance.wait_for_success()
+            with (throttle.slot() if throttle else nullcontext({})) as report:
+                self._instance = run_sql(sql, hints=hints, priority=self._statement_priority)
+                RUNNING_INSTANCES.add(self._connection, self._instance)
+                try:
+                    logger.debug(f"""instance log url: {self._instance.get_logview_address()}""")
+                    report["queue_seconds"] = self._wait_for_instance(
+                        self._instance, track_queue=throttle is not None, timeout=self._statement_timeout
+                    )
+                finally:
+                    RUNNING_INSTANCES.discard(self._connection, self._instance)
            
+            if interactive:
+                return
             # print task summary 
             task_detail = self._instance.get_task_detail()
             task_summary = task_detail.get('Instance', {}).get('Summary','')
@@ -53,6 +252,121 @@ class ODPSCursor(Cursor):
             logger.error(f"An unexpected error occurred: {e}")
             raise e
 
+    def _route_interactive(self, sql) -> bool:
+        """
+        Whether a select goes through query acceleration: the model's `interactive` setting decides first,
+        then the profile mode, `queries` routes every select, `auto` the ones reading small tables.
+        """
+        if not is_select(sql):
+            return False
+        connection = self._connection
+        if connection.options.interactive is not None:
+            return connection.options.interactive
+        if connection.interactive == "queries":
+            return True
+        if connection.interactive != "auto" or connection.table_sizes is None:
+            return False
+        input_size = connection.table_sizes.input_size(connection.odps, sql)
+        return input_size is not None and input_size <= connection.interactive_max_input_bytes
+
+    def _run_interactive(self, sql, hints=None, priority=None):
+        """Run the select in the query acceleration session, falling back to a normal instance per `fallback_policy`"""
+        odps = self._connection.odps
+        try:
+            instance = odps.run_sql_interactive(sql, service_name=self._connection._session_name, hints=hints)
+            RUNNING_INSTANCES.add(self._connection, instance)
+            try:
+                instance.wait_for_success(interval=0.5, timeout=self._statement_timeout)
+            finally:
+                RUNNING_INSTANCES.discard(self._connection, instance)
+            return instance
+        except WaitTimeoutError:
+            self._stop_timed_out(instance, self._statement_timeout)
+        except ODPSError as e:
+            if not self._sqa_error_should_fallback(str(e)):
+                raise
+            logger.debug(f"Query acceleration unavailable, running a normal instance: {e}")
+            return odps.run_sql(sql, hints=hints, priority=priority)
+
+    @classmethod
+    def _wait_for_instance(cls, instance, track_queue=False, timeout=None):
+        """
+        Wait until the instance succeeds, return how long it waited in the queue when tracked.
+        An instance still running after `timeout` seconds is stopped.
+        """
+        if not track_queue and timeout is None:
+            instance.wait_for_success()
+            return None
+        submitted = time.time()
+        queue_seconds = None
+        while not instance.is_terminated():
+            if timeout is not None and time.time() - submitted > timeout:
+                cls._stop_timed_out(instance, timeout)
+            if track_queue and queue_seconds is None and any(
+                task.status == Instance.Task.TaskStatus.RUNNING
+                for task in instance.get_task_statuses().values()
+            ):
+                queue_seconds = time.time() - submitted
+            time.sleep(POLL_INTERVAL)
+        instance.wait_for_success()
+        if not track_queue:
+            return None
+        return queue_seconds if queue_seconds is not None else time.time() - submitted
+
+    @staticmethod
+    def _stop_timed_out(instance, timeout):
+        try:
+            instance.stop()
+        except ODPSError as e:
+            logger.debug(f"Failed to stop instance {instance.id}: {e}")
+        raise QueryTimeoutError(instance.id, timeout)
+
+    def _result_count(self, reader, limit: Optional[int]) -> int:
+        return reader.count if limit is None else min(max(limit, 0), reader.count)
+
+    def iter_rows(self, limit: Optional[int] = None):
+        """
+        Stream the result rows through the instance tunnel, only the first `limit` rows are downloaded.
+        Blocks of large results are downloaded by `download_threads` threads.
+        """
+        self._check_download_session()
+        if self._download_session is None:
+            yield from self._fetch_non_select()
+            return
+        reader = self._download_session
+        count = self._result_count(reader, limit)
+        threads = self._connection.download_threads
+        if threads <= 1 or count <= DOWNLOAD_BLOCK_ROWS:
+            for record in reader.read(start=0, count=count):
+                yield record.values
+            return
+
+        def download(start):
+            size = min(DOWNLOAD_BLOCK_ROWS, count - start)
+            return [record.values for record in reader.read(start=start, count=size)]
+
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            # at most `threads` blocks are held ahead of the consumer
+            pending: Deque[Future] = deque()
+            for start in range(0, count, DOWNLOAD_BLOCK_ROWS):
+                pending.append(executor.submit(download, start))
+                if len(pending) >= threads:
+                    yield from pending.popleft().result()
+            while pending:
+                yield from pending.popleft().result()
+
+    def fetch_arrow(self, limit: Optional[int] = None):
+        """The result as a pyarrow Table, read straight from the tunnel"""
+        reader = self._instance.open_reader(tunnel=True, limit=False, arrow=True)
+        return reader.read_all(start=0, count=self._result_count(reader, limit))
+
+    def fetch_pandas(self, limit: Optional[int] = None):
+        """The result as a pandas DataFrame, downloaded by `download_threads` processes"""
+        reader = self._instance.open_reader(tunnel=True, limit=False)
+        return reader.to_pandas(
+            start=0, count=self._result_count(reader, limit), n_process=max(self._connection.download_threads, 1)
+        )
+
 
 class ODPSConnection(Connection):
     def __init__(self, *argv , **kwargs):
@@ -61,6 +375,51 @@ class ODPSConnection(Connection):
              self._priority = kwargs.pop('priority',None)
         
         super().__init__( *argv, **kwargs)
+        self._cursor = None
+        self.script = None
+        self.options = QueryOptions()
+        self.throttle = None
+        self.download_threads = 1
+        self.interactive = "off"
+        self.interactive_max_input_bytes = 0
+        self.table_sizes: Optional[TableSizes] = None
+        self.retry_policy = RetryPolicy()
+        self.query_timeout = None
+
+    def begin_script(self):
+        """Buffer DDL/DML from now on, until end_script submits them as one script instance"""
+        self.script = SqlScript()
+
+    def flush_script(self):
+        script = self.script
+        if not script:
+            return
+        # detach the buffer while submitting, so the script cursor runs for real
+        self.script = None
+        try:
+            self.cursor().execute_script(script)
+        finally:
+            script.clear()
+            self.script = script
+
+    @contextmanager
+    def script_suspended(self):
+        self.flush_script()
+        script, self.script = self.script, None
+        try:
+            yield
+        finally:
+            self.script = script
+
+    def end_script(self):
+        try:
+            self.flush_script()
+        finally:
+            self.script = None
+
+    def close(self):
+        self.script = None
+        super().close()
 
     def cursor(self, *args, **kwargs):
         kwargs['priority'] = self._priority
@@ -76,5 +435,5 @@ class ODPSConnection(Connection):
         return self._cursor
 
     def cancel(self):
-        if self._cursor is not None:
-            self._cursor.cancel()
+        """Stop every instance still running on this connection, from any of its cursors"""
+        return RUNNING_INSTANCES.stop_all(self)
@@ -1,5 +1,25 @@
+from typing import Optional
+
+
 class NotTableError(RuntimeError):
     def __init__(self, code: str, message: str) -> None:
         super().__init__()
         self.code = code
         self.message = message
+
+
+class ScriptStatementError(RuntimeError):
+    def __init__(self, message: str, statement: Optional[str] = None) -> None:
+        if statement:
+            super().__init__(f"{message}\nFailed statement in script:\n{statement}")
+        else:
+            super().__init__(message)
+        self.message = message
+        self.statement = statement
+
+
+class QueryTimeoutError(RuntimeError):
+    def __init__(self, instance_id: str, timeout: float) -> None:
+        super().__init__(f"Statement exceeded query_timeout of {timeout:g}s, instance {instance_id} was stopped")
+        self.instance_id = instance_id
+        self.timeout = timeout
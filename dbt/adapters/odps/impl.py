@@ -1,17 +1,20 @@
 import os
 import pickle
 import tempfile
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
 from dataclasses import dataclass
 from functools import lru_cache
 from pathlib import Path
-from typing import List, Optional, Dict, Iterable, Any
+from typing import Callable, List, Optional, Dict, Iterable, Any, Tuple, Union
 
 import agate
 import dbt.exceptions
 import odps
-from dbt.adapters.base import AdapterConfig
+from dbt.adapters.base import AdapterConfig, available
 from dbt.adapters.base.relation import BaseRelation
 from dbt.adapters.sql import SQLAdapter
 from dbt.adapters.capability import Capability, CapabilityDict, CapabilitySupport, Support
@@ -22,13 +25,16 @@ from dbt.contracts.relation import RelationType
 from odps import ODPS
 from odps.errors import ODPSError, NoSuchObject
 from odps.models import Table
+from odps.types import PartitionSpec
 from packaging import version
 
 import dbt
-from dbt.adapters.odps.utils import print_method_call, logger
+from dbt.adapters.odps.utils import print_method_call, logger, fingerprint, normalize_sql, cluster_layout_matches
 from .colums import OdpsColumn
-from .connections import ODPSConnectionManager, ODPSCredentials
+from .connections import ODPSConnectionManager, ODPSCredentials, OdpsAdapterResponse
 from .relation import OdpsRelation
+from .schema_cache import SchemaCache
+from .test_batch import TestBatcher
 
 LIST_RELATIONS_MACRO_NAME = "list_relations_without_caching"
 SHOW_CREATE_TABLE_MACRO_NAME = "show_create_table"
@@ -39,6 +45,11 @@ RENAME_RELATION_MACRO_NAME = "rename_relation"
 class OdpsConfig(AdapterConfig):
     partitioned_by: Optional[List[Dict[str, str]]] = None
     properties: Optional[Dict[str, str]] = None
+    submit_mode: Optional[str] = None
+    hints: Optional[Dict[str, str]] = None
+    priority: Optional[int] = None
+    interactive: Optional[bool] = None
+    query_timeout: Optional[float] = None
 
 
 class ODPSAdapter(SQLAdapter):
@@ -47,6 +58,7 @@ class ODPSAdapter(SQLAdapter):
     """
 
     ConnectionManager = ODPSConnectionManager
+    connections: ODPSConnectionManager
     Relation = OdpsRelation
     Column = OdpsColumn
     AdapterSpecificConfigs = OdpsConfig
@@ -58,6 +70,30 @@ class ODPSAdapter(SQLAdapter):
         }
     )
 
+    def __init__(self, config) -> None:
+        super().__init__(config)
+        # query columns persist in the project's target directory, private to it unlike a shared tempdir
+        cache_enabled = os.getenv('ODPS_SCHEMA_CACHE_ENABLE', 'false') == 'true'
+        target_path = getattr(config, "project_target_path", None)
+        self.schema_cache = SchemaCache(
+            Path(target_path) / "odps_schema_cache" if cache_enabled and target_path else None
+        )
+        # upstream data versions, a relation is only looked up after it was built in this run
+        self._modified_times: Dict[str, Optional[datetime]] = {}
+        self._meta_modified_times: Dict[str, Optional[datetime]] = {}
+        self._modified_times_lock = threading.Lock()
+        # stored view texts per schema, fetched with one listing
+        self._view_texts: Dict[tuple, Dict[str, str]] = {}
+        self._view_texts_lock = threading.Lock()
+        self.skipped_views = 0
+        self.test_batcher = TestBatcher(self.credentials.test_batch_window, self.credentials.test_batch_size)
+
+    def cleanup_connections(self) -> None:
+        if self.skipped_views:
+            logger.info(f"Skipped {self.skipped_views} unchanged views")
+            self.skipped_views = 0
+        super().cleanup_connections()
+
     @property
     def odps(self) -> ODPS:
         return self.connections.get_thread_connection().handle.odps
@@ -68,6 +104,15 @@ class ODPSAdapter(SQLAdapter):
     def credentials(self) -> ODPSCredentials:
         return self.config.credentials
 
+    @contextmanager
+    def connection_named(self, name: str, node: Optional[Any] = None):
+        self.connections.set_query_options(node)
+        try:
+            with super().connection_named(name, node):
+                yield
+        finally:
+            self.connections.set_query_options(None)
+
     @classmethod
     def date_function(cls) -> str:
         return "CURRENT_TIMESTAMP()"
@@ -90,6 +135,92 @@ class ODPSAdapter(SQLAdapter):
     def convert_text_type(cls, agate_table, col_idx: int) -> str:
         return "string"
 
+    @available
+    def begin_script(self, submit_mode: Optional[str] = None) -> bool:
+        """Start buffering the DDL/DML of a materialization when the submit mode is `script`"""
+        submit_mode = submit_mode or self.credentials.submit_mode
+        if submit_mode != "script":
+            return False
+        self.connections.begin_script()
+        return True
+
+    @available
+    def end_script(self) -> None:
+        """Submit the buffered statements as a single ODPS script instance"""
+        self.connections.end_script()
+
+    def fetch_arrow(self, sql: str, limit: Optional[int] = None):
+        """Run a query and return its result as a pyarrow Table, without building agate rows"""
+        _, cursor = self.connections.add_select_query(sql)
+        return cursor.fetch_arrow(limit)
+
+    def fetch_pandas(self, sql: str, limit: Optional[int] = None):
+        """Run a query and return its result as a pandas DataFrame, without building agate rows"""
+        _, cursor = self.connections.add_select_query(sql)
+        return cursor.fetch_pandas(limit)
+
+    @available
+    def execute_script(self, statements: List[str]) -> OdpsAdapterResponse:
+        """Run the statements as a single ODPS script instance"""
+        return self.connections.execute_script(statements)
+
+    @available
+    def submit_statements(self, statements: List[str]) -> List[str]:
+        """
+        Start the statements without waiting for them, for work off the model's critical path.
+        A statement failing to start is only logged, return the ids of the started instances.
+        """
+        instance_ids = []
+        for sql in statements:
+            try:
+                instance_ids.append(self.connections.submit(sql))
+            except dbt.exceptions.DbtRuntimeError as e:
+                logger.warning(f"Failed to submit statement: {sql}\n{e}")
+        return instance_ids
+
+    @available
+    def execute_concurrently(
+        self, statements: List[str], concurrency: int = 4, partitions: Optional[List[str]] = None
+    ) -> OdpsAdapterResponse:
+        """Run independent statements as concurrent instances, report the partitions they touched"""
+        responses = self.connections.execute_many(statements, concurrency)
+        instance_ids = [instance_id for response in responses for instance_id in response.instance_ids]
+        return OdpsAdapterResponse(
+            _message=f"OK {len(responses)}",
+            instance_ids=instance_ids,
+            partitions=partitions,
+        )
+
+    @available
+    def execute_batches(
+        self, statements: List[str], concurrency: int = 4, labels: Optional[List[str]] = None, retries: int = 0
+    ) -> Dict[str, Any]:
+        """
+        Run batches concurrently, retrying each failed one. Unlike execute_concurrently it does not raise,
+        the indexes and errors of failed batches are returned so the caller can record where to resume.
+        """
+        labels = labels or [str(i) for i in range(len(statements))]
+        results = self.connections.execute_many(statements, concurrency, retries=retries, return_exceptions=True)
+        failed = [i for i, result in enumerate(results) if isinstance(result, Exception)]
+        succeeded = [i for i in range(len(results)) if i not in failed]
+        response = OdpsAdapterResponse(
+            _message=f"OK {len(succeeded)}/{len(results)}",
+            instance_ids=[instance_id for i in succeeded for instance_id in results[i].instance_ids],
+            partitions=[labels[i] for i in succeeded],
+        )
+        return {
+            "response": response,
+            "failed": failed,
+            "errors": [f"{labels[i]}: {results[i]}" for i in failed],
+        }
+
+    @available
+    def partition_spec(self, spec) -> Dict[str, str]:
+        """Partition spec as an ordered dict, from a mapping or a string like `ds='20240101',hh='01'`"""
+        if isinstance(spec, dict):
+            return {str(k): str(v) for k, v in spec.items()}
+        return dict(PartitionSpec(str(spec)).kv)
+
     def timestamp_add_sql(self, add_to: str, number: int = 1, interval: str = "hour") -> str:
         """the interval could be one of [dd, mm, yyyy, mi, ss, year, month, mon, day, hour, hh]'"""
         # return f"{add_to} + interval '{number} {interval}'"
@@ -239,6 +370,7 @@ class ODPSAdapter(SQLAdapter):
     @print_method_call
     def get_odps_table_by_relation(self, relation: OdpsRelation, retry_times=3):
         # Sometimes the newly created table will be judged as not existing, so add retry to obtain it.
+        self.connections.flush_script()
         for i in range(retry_times):
             table = self.get_odps_client().get_table(
                 relation.identifier, relation.project, relation.schema
@@ -272,6 +404,29 @@ class ODPSAdapter(SQLAdapter):
         return None, freshness
         
 
+    # override
+    @available.parse(lambda *a, **k: [])
+    def get_column_schema_from_query(
+        self, sql: str, relations: Optional[List[OdpsRelation]] = None
+    ) -> List[OdpsColumn]:
+        """
+        Columns of a query, read from the result schema of its empty (`limit 0`) version.
+        ODPS has no compile-only way to the result schema, so that still runs an instance, reading no data.
+        Results are cached, contracts and incremental checks ask for the same query repeatedly;
+        across runs too when the `relations` it reads are given, keyed by their last schema change.
+        """
+        version = None
+        if relations:
+            modified_times = self.get_meta_modified_times(relations)
+            if all(modified_time is not None for modified_time in modified_times.values()):
+                version = fingerprint("", modified_times)
+        columns = self.schema_cache.get(sql, version)
+        if columns is not None:
+            return list(columns)
+        columns = super().get_column_schema_from_query(sql)
+        self.schema_cache.put(sql, columns, version)
+        return list(columns)
+
     # override
     @print_method_call
     def get_columns_in_relation(self, relation: OdpsRelation):
@@ -284,11 +439,229 @@ class ODPSAdapter(SQLAdapter):
             else []
         )
 
+    @available
+    def get_partition_columns_in_relation(self, relation: OdpsRelation) -> List[OdpsColumn]:
+        odps_table = self.get_odps_table_by_relation(relation)
+        return (
+            [OdpsColumn.from_odps_column(column) for column in odps_table.table_schema.partitions]
+            if odps_table
+            else []
+        )
+
+    @available
+    def get_cluster_layout(self, relation: OdpsRelation) -> Optional[Dict[str, Any]]:
+        """Clustering of the table in the shape of the `odps__cluster_layout` macro, none when not clustered"""
+        odps_table = self.get_odps_table_by_relation(relation)
+        info = getattr(odps_table, "cluster_info", None) if odps_table is not None else None
+        if info is None:
+            return None
+        return {
+            "type": info.cluster_type.value,
+            "columns": list(info.cluster_cols or []),
+            "sorted_by": [
+                {"name": col.name, "order": col.order.value.lower() if col.order else "asc"}
+                for col in info.sort_cols or []
+            ],
+            "buckets": info.bucket_num,
+        }
+
+    @available
+    def cluster_layout_matches(self, relation: OdpsRelation, layout: Optional[Dict[str, Any]]) -> bool:
+        return cluster_layout_matches(self.get_cluster_layout(relation), layout)
+
+    @available
+    def is_transactional(self, relation: OdpsRelation) -> bool:
+        odps_table = self.get_odps_table_by_relation(relation)
+        return bool(odps_table is not None and odps_table.is_transactional)
+
+    @available
+    def get_data_modified_time(self, relation: OdpsRelation) -> float:
+        """Epoch seconds of the last data change of the table, 0 when it doesn't exist"""
+        odps_table = self.get_odps_table_by_relation(relation)
+        if odps_table is None or odps_table.last_data_modified_time is None:
+            return 0
+        return odps_table.last_data_modified_time.timestamp()
+
+    def _partitioned_table(self, relation: OdpsRelation) -> Optional[Any]:
+        """The ODPS table of the relation, none when it doesn't exist or is not partitioned"""
+        odps_table = self.get_odps_table_by_relation(relation)
+        if odps_table is None or not odps_table.table_schema.partitions:
+            return None
+        return odps_table
+
+    @available
+    def latest_partitions(self, relation: OdpsRelation, count: int) -> Optional[List[Dict[str, str]]]:
+        """Specs of the `count` greatest partitions by the type of their columns, none when the table is not partitioned"""
+        odps_table = self._partitioned_table(relation)
+        if odps_table is None:
+            return None
+        columns = odps_table.table_schema.partitions
+        integral = [str(column.type).lower() in ("tinyint", "smallint", "int", "bigint") for column in columns]
+
+        def typed(spec: Dict[str, str]) -> tuple:
+            return tuple(int(value) if is_int else value for value, is_int in zip(spec.values(), integral))
+
+        specs = [dict(partition.partition_spec.kv) for partition in odps_table.iterate_partitions()]
+        return sorted(specs, key=typed, reverse=True)[:count]
+
+    @available
+    def partitions_modified_after(self, relation: OdpsRelation, timestamp: float) -> Optional[List[Dict[str, str]]]:
+        """Specs of the partitions whose data changed after the epoch `timestamp`, none when not partitioned"""
+        odps_table = self._partitioned_table(relation)
+        if odps_table is None:
+            return None
+        return [
+            dict(partition.partition_spec.kv)
+            for partition in odps_table.iterate_partitions()
+            if partition.last_data_modified_time is not None
+            and partition.last_data_modified_time.timestamp() > timestamp
+        ]
+
+    @available
+    def stale_partitions(self, relation: OdpsRelation, written_after: float) -> List[str]:
+        """Specs of the partitions whose data didn't change after the epoch `written_after`, a full overwrite didn't write them"""
+        odps_table = self._partitioned_table(relation)
+        if odps_table is None:
+            return []
+        return [
+            str(partition.partition_spec)
+            for partition in odps_table.iterate_partitions()
+            if partition.last_data_modified_time is None
+            or partition.last_data_modified_time.timestamp() <= written_after
+        ]
+
+    @available
+    def get_table_lifecycle(self, relation: OdpsRelation) -> Optional[int]:
+        """Lifecycle days of the table, none when it has none"""
+        odps_table = self.get_odps_table_by_relation(relation)
+        if odps_table is None or odps_table.lifecycle is None or odps_table.lifecycle <= 0:
+            return None
+        return odps_table.lifecycle
+
+    @available
+    def skip_unchanged_enabled(self, model_setting: Optional[bool] = None) -> bool:
+        return self.credentials.skip_unchanged if model_setting is None else bool(model_setting)
+
+    @available
+    def model_fingerprint(
+        self, sql: str, relations: List[OdpsRelation], config: Optional[Dict[str, Any]] = None
+    ) -> Optional[str]:
+        """
+        Fingerprint of the model sql, its table `config` and the last data modification of its upstream relations,
+        none when the data version of an upstream can't be known (views, external tables).
+        """
+        modified_times = self.get_modified_times(relations)
+        if any(modified_time is None for modified_time in modified_times.values()):
+            return None
+        return fingerprint(sql, modified_times, config)
+
+    def get_modified_times(self, relations: List[OdpsRelation]) -> Dict[str, Optional[datetime]]:
+        """Last data modification time of the relations, looked up concurrently and cached for the run"""
+
+        def data_modified_time(table: Table) -> Optional[datetime]:
+            # the data behind views and external tables changes without them
+            if table.type in (Table.Type.VIRTUAL_VIEW, Table.Type.EXTERNAL_TABLE):
+                return None
+            return table.last_data_modified_time
+
+        return self._lookup_times(relations, self._modified_times, data_modified_time)
+
+    def get_meta_modified_times(self, relations: List[OdpsRelation]) -> Dict[str, Optional[datetime]]:
+        """Last schema (meta) modification time of the relations, looked up concurrently and cached for the run"""
+        return self._lookup_times(relations, self._meta_modified_times, lambda table: table.last_meta_modified_time)
+
+    def _lookup_times(
+        self,
+        relations: List[OdpsRelation],
+        cache: Dict[str, Optional[datetime]],
+        read: Callable[[Table], Optional[datetime]],
+    ) -> Dict[str, Optional[datetime]]:
+        # a relation is only looked up after it was built in this run
+        by_name = {relation.render(): relation for relation in relations}
+        with self._modified_times_lock:
+            missing = [name for name in by_name if name not in cache]
+        if missing:
+            client = self.get_odps_client()
+
+            def lookup(relation: OdpsRelation) -> Optional[datetime]:
+                table = client.get_table(relation.identifier, relation.database, relation.schema)
+                try:
+                    table.reload()
+                except NoSuchObject:
+                    return None
+                return read(table)
+
+            with ThreadPoolExecutor(max_workers=min(len(missing), 8)) as executor:
+                found = list(executor.map(lookup, [by_name[name] for name in missing]))
+            with self._modified_times_lock:
+                cache.update(zip(missing, found))
+        with self._modified_times_lock:
+            return {name: cache.get(name) for name in by_name}
+
+    @available
+    def view_definition_matches(self, relation: OdpsRelation, sql: str) -> bool:
+        """Whether the existing view was created from the same sql, counts the views skipped this way"""
+        if relation.database is None or relation.identifier is None:
+            return False
+        stored = self._get_view_texts(relation.database, relation.schema).get(relation.identifier.lower())
+        if stored is None or normalize_sql(stored) != normalize_sql(sql):
+            return False
+        with self._view_texts_lock:
+            self.skipped_views += 1
+        return True
+
+    def _get_view_texts(self, database: str, schema: str) -> Dict[str, str]:
+        key = (database, schema)
+        with self._view_texts_lock:
+            if key not in self._view_texts:
+                views = self.get_odps_client().list_tables(
+                    project=database, schema=schema, type="virtual_view", extended=True
+                )
+                self._view_texts[key] = {view.name.lower(): view.view_text for view in views}
+            return self._view_texts[key]
+
+    @available
+    def test_batching_enabled(self, test_setting: Optional[bool] = None) -> bool:
+        return self.credentials.test_batch_window > 0 and test_setting is not False
+
+    @available
+    def run_batched_test(self, key: Optional[str], sql: str):
+        """Run a test query together with the concurrent tests on the same model, returns (response, table)"""
+        result = self.test_batcher.run(key, sql, self._run_test_batch)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def _run_test_batch(self, sqls: List[str]) -> List[Union[Tuple, Exception]]:
+        if len(sqls) > 1:
+            combined = "\nunion all\n".join(
+                f"select {index} as dbt_batch_index, dbt_batch_test.* from (\n{sql}\n) dbt_batch_test"
+                for index, sql in enumerate(sqls)
+            )
+            try:
+                response, table = self.connections.execute(combined, fetch=True)
+            except dbt.exceptions.DbtRuntimeError as e:
+                logger.debug(f"Batch of {len(sqls)} tests failed, running them one by one: {e}")
+            else:
+                logger.debug(f"Ran {len(sqls)} tests in one query")
+                return [
+                    (response, table.where(lambda row, i=index: row["dbt_batch_index"] == i).exclude(["dbt_batch_index"]))
+                    for index in range(len(sqls))
+                ]
+
+        # the tests of a batch ran concurrently in the first place, so do their fallbacks
+        return self.connections.execute_many(sqls, concurrency=len(sqls), return_exceptions=True, fetch=True)
+
+    @available
+    def unchanged_response(self) -> OdpsAdapterResponse:
+        return OdpsAdapterResponse(_message="SKIP unchanged")
+
     @print_method_call
     def get_relation(self, database: str, schema: str, identifier: str) -> Optional[BaseRelation]:
         """Get a Relation for own list"""
         # if not self.Relation.get_default_quote_policy().database:
         #     database = None
+        self.connections.flush_script()
         odpsTable = self.get_odps_client().get_table(identifier, database, schema)
         try:
             odpsTable.reload()
@@ -0,0 +1,91 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from dbt.adapters.odps.utils import logger
+
+STOP_CONCURRENCY = 8
+# outcome of stopping a background instance that had already finished
+_FINISHED = Exception("finished")
+
+
+class InstanceRegistry(object):
+    """
+    Instances started by the adapter that are still running, by the connection that started them,
+    so an interrupted or failing run can stop all of them at once.
+    """
+
+    def __init__(self):
+        self._instances: Dict[int, Dict[str, Any]] = {}
+        # ids of instances started in the background, they may have finished unnoticed when stopping
+        self._background: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def add(self, owner, instance, background: bool = False):
+        with self._lock:
+            self._instances.setdefault(id(owner), {})[instance.id] = instance
+            if background:
+                self._background.add(instance.id)
+
+    def discard(self, owner, instance):
+        with self._lock:
+            instances = self._instances.get(id(owner), {})
+            instances.pop(instance.id, None)
+            if not instances:
+                self._instances.pop(id(owner), None)
+            self._background.discard(instance.id)
+
+    def background(self, owner=None) -> List[str]:
+        """Ids of the registered instances started in the background"""
+        with self._lock:
+            return [instance.id for instance in self._running(owner) if instance.id in self._background]
+
+    def running(self, owner=None) -> List[Any]:
+        with self._lock:
+            return self._running(owner)
+
+    def _running(self, owner=None) -> List[Any]:
+        if owner is not None:
+            return list(self._instances.get(id(owner), {}).values())
+        return [instance for instances in self._instances.values() for instance in instances.values()]
+
+    def stop_all(self, owner=None) -> Tuple[List[str], List[str]]:
+        """
+        Stop the running instances of `owner`, or of the whole process, in parallel; return the stopped and failed ids.
+        Background instances are dropped once stopped, those that already finished are not reported.
+        """
+        instances = self.running(owner)
+        if not instances:
+            return [], []
+        with self._lock:
+            background = set(self._background)
+
+        def stop(instance) -> Optional[Exception]:
+            try:
+                if instance.id in background and instance.is_terminated():
+                    return _FINISHED
+                instance.stop()
+            except Exception as e:
+                logger.debug(f"Failed to stop instance {instance.id}: {e}")
+                return e
+            return None
+
+        with ThreadPoolExecutor(max_workers=min(len(instances), STOP_CONCURRENCY)) as executor:
+            errors = list(executor.map(stop, instances))
+        with self._lock:
+            for instance, error in zip(instances, errors):
+                # a background instance may outlive the thread watching it
+                if instance.id not in background or error not in (None, _FINISHED):
+                    continue
+                for owner_id, owned in list(self._instances.items()):
+                    owned.pop(instance.id, None)
+                    if not owned:
+                        del self._instances[owner_id]
+                self._background.discard(instance.id)
+        stopped = [instance.id for instance, error in zip(instances, errors) if error is None]
+        failed = [instance.id for instance, error in zip(instances, errors) if error not in (None, _FINISHED)]
+        return stopped, failed
+
+
+# every instance the adapter runs in this process
+RUNNING_INSTANCES = InstanceRegistry()
@@ -0,0 +1,48 @@
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+# transient failures: http 5xx and connection errors of the endpoint, system internal errors,
+# failed meta updates and fuxi jobs failing on lost workers
+DEFAULT_RETRY_ERRORS = [
+    "InternalServerError",
+    "BadGatewayError",
+    "ServiceUnavailable",
+    "ConnectTimeout",
+    "RequestsConnectTimeout",
+    "ConnectionError",
+    "ODPS-0010000",
+    "ODPS-0110061",
+    "ODPS-0123144",
+]
+MAX_BACKOFF = 300
+
+
+@dataclass
+class RetryPolicy:
+    """
+    How idempotent statements are resubmitted after a transient failure: up to `retries` times,
+    waiting `backoff` seconds doubling each time, giving up once `max_elapsed` seconds have passed.
+    `errors` lists the retryable error codes (`ODPS-0123144`) and pyodps exception names.
+    """
+    retries: int = 0
+    backoff: float = 5.0
+    max_elapsed: float = 1800.0
+    errors: List[str] = field(default_factory=lambda: list(DEFAULT_RETRY_ERRORS))
+
+    def is_retryable(self, error: Exception) -> bool:
+        names = {cls.__name__ for cls in type(error).__mro__}
+        code = getattr(error, "code", None) or ""
+        message = str(error)
+        return any(
+            entry in names or (entry.startswith("ODPS-") and (code.startswith(entry) or entry in message))
+            for entry in self.errors
+        )
+
+    def next_delay(self, error: Exception, attempt: int, elapsed: float) -> Optional[float]:
+        """Seconds to wait before retrying after the failed `attempt` (from 0), None to give up"""
+        if attempt >= self.retries or not self.is_retryable(error):
+            return None
+        delay = min(self.backoff * 2 ** attempt, MAX_BACKOFF)
+        if elapsed + delay > self.max_elapsed:
+            return None
+        return delay
@@ -0,0 +1,83 @@
+import json
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from dbt.adapters.odps.utils import logger
+
+DEFAULT_PRIORITY = 9
+HIGHEST_AUTO_PRIORITY = 1
+
+
+def _is_work_node(unique_id: str) -> bool:
+    # tests are cheap and never block other nodes
+    return not unique_id.startswith("test.")
+
+
+def critical_path_scores(child_map: Dict[str, List[str]]) -> Dict[str, Tuple[int, int]]:
+    """
+    Score every node by (critical path length, downstream fan-out).
+    The critical path length counts the nodes on the longest chain starting at the node,
+    the fan-out counts every node downstream of it.
+    """
+    children = {
+        node: [child for child in childs if _is_work_node(child)]
+        for node, childs in child_map.items()
+        if _is_work_node(node)
+    }
+    lengths: Dict[str, int] = {}
+    descendants: Dict[str, set] = {}
+
+    for root in children:
+        if root in lengths:
+            continue
+        # iterative post-order walk, manifests can be deeper than the recursion limit
+        stack = [(root, False)]
+        while stack:
+            node, expanded = stack.pop()
+            if node in lengths:
+                continue
+            if not expanded:
+                stack.append((node, True))
+                stack.extend((child, False) for child in children.get(node, []) if child not in lengths)
+                continue
+            below = set()
+            length = 1
+            for child in children.get(node, []):
+                below.add(child)
+                below |= descendants.get(child, set())
+                length = max(length, lengths.get(child, 0) + 1)
+            lengths[node] = length
+            descendants[node] = below
+
+    return {node: (lengths[node], len(descendants[node])) for node in lengths}
+
+
+def critical_path_priorities(
+    child_map: Dict[str, List[str]],
+    lowest: int = DEFAULT_PRIORITY,
+    highest: int = HIGHEST_AUTO_PRIORITY,
+) -> Dict[str, int]:
+    """
+    Map nodes to ODPS priorities (smaller runs first): leaf nodes get `lowest`,
+    the nodes blocking the longest and widest downstream work get `highest`.
+    """
+    scores = critical_path_scores(child_map)
+    levels = sorted(set(scores.values()))
+    span = max(lowest - highest, 0)
+    if len(levels) <= 1 or span == 0:
+        return {node: lowest for node in scores}
+
+    rank = {score: index for index, score in enumerate(levels)}
+    return {
+        node: lowest - round(rank[score] * span / (len(levels) - 1))
+        for node, score in scores.items()
+    }
+
+
+def load_child_map(target_path: str) -> Dict[str, List[str]]:
+    manifest_path = Path(target_path) / "manifest.json"
+    if not manifest_path.exists():
+        logger.debug(f"No manifest found at {manifest_path}, auto priority disabled")
+        return {}
+    with manifest_path.open() as f:
+        return json.load(f).get("child_map", {})
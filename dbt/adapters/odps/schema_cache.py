@@ -0,0 +1,67 @@
+import hashlib
+import pickle
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from dbt.adapters.odps.utils import logger
+
+
+class SchemaCache(object):
+    """
+    Column schemas of queries keyed by a hash of their SQL and of the version of the relations they read.
+    Entries live for the run, versioned ones also in `cache_dir` for `ttl` seconds across runs
+    when a directory is given.
+    """
+
+    def __init__(self, cache_dir: Optional[Path] = None, ttl: float = 3600):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self._columns: Dict[str, List] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(sql: str, version: Optional[str] = None) -> str:
+        digest = hashlib.sha256(sql.strip().encode("utf-8"))
+        if version is not None:
+            digest.update(f"\n{version}".encode("utf-8"))
+        return digest.hexdigest()
+
+    @staticmethod
+    def _path(cache_dir: Path, key: str) -> Path:
+        return cache_dir / f"odps_schema_{key}"
+
+    def get(self, sql: str, version: Optional[str] = None) -> Optional[List]:
+        key = self.key(sql, version)
+        with self._lock:
+            columns = self._columns.get(key)
+        if columns is not None or self.cache_dir is None or version is None:
+            return columns
+
+        path = self._path(self.cache_dir, key)
+        if not path.exists() or time.time() - path.stat().st_mtime >= self.ttl:
+            return None
+        try:
+            with path.open("rb") as f:
+                columns = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError) as e:
+            logger.debug(f"Ignore broken schema cache file {path}: {e}")
+            return None
+        with self._lock:
+            self._columns[key] = columns
+        return columns
+
+    def put(self, sql: str, columns: List, version: Optional[str] = None):
+        """Keep the columns of the query, across runs only when the `version` of what it reads is known"""
+        key = self.key(sql, version)
+        with self._lock:
+            self._columns[key] = columns
+        if self.cache_dir is None or version is None:
+            return
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            with self._path(self.cache_dir, key).open("wb") as f:
+                pickle.dump(columns, f)
+        except OSError as e:
+            logger.debug(f"Failed to save schema cache: {e}")
@@ -0,0 +1,57 @@
+import re
+from typing import Dict, List, Optional
+
+SCRIPT_MODE_HINTS = {"odps.sql.submit.mode": "script"}
+
+_ERROR_POSITION = re.compile(r"\[(\d+),\s*(\d+)\]")
+
+
+class SqlScript(object):
+    """
+    DDL/DML statements buffered on a connection, submitted as one ODPS script instance.
+    The `set` hints of a script apply to all of its statements, so only statements with the same hints share one.
+    """
+
+    def __init__(self):
+        self.statements: List[str] = []
+        self.hints: Dict[str, str] = {}
+
+    def __len__(self):
+        return len(self.statements)
+
+    def accepts(self, hints: Optional[Dict[str, str]] = None) -> bool:
+        """Whether a statement with these hints can join the script without changing how the others run"""
+        return not self.statements or (hints or {}) == self.hints
+
+    def add(self, sql: str, hints: Optional[Dict[str, str]] = None):
+        if not self.accepts(hints):
+            raise ValueError(f"Hints {hints} differ from the hints {self.hints} of the buffered script")
+        sql = sql.strip().rstrip(";").strip()
+        if sql:
+            if not self.statements:
+                self.hints = dict(hints or {})
+            self.statements.append(sql)
+
+    def clear(self):
+        self.statements = []
+        self.hints = {}
+
+    def render(self) -> str:
+        return "\n".join(statement + ";" for statement in self.statements)
+
+    def locate(self, message: str) -> Optional[str]:
+        """
+        Find the statement an ODPS error message refers to, error positions look like `[line,column]`
+        and are relative to the rendered script.
+        """
+        find = _ERROR_POSITION.search(message or "")
+        if not find:
+            return None
+        line = int(find.group(1))
+        start = 1
+        for statement in self.statements:
+            end = start + statement.count("\n")
+            if start <= line <= end:
+                return statement
+            start = end + 1
+        return None
@@ -0,0 +1,60 @@
+import threading
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+
+class _Batch(object):
+    def __init__(self):
+        self.sqls: List[str] = []
+        self.results: List[Any] = []
+        self.error: Optional[BaseException] = None
+        self.done = threading.Event()
+
+
+class TestBatcher(object):
+    """
+    Groups data tests on the same model that run at about the same time into one query.
+
+    The first test of a group waits up to `window` seconds (or until `max_size` tests joined)
+    for the others, then runs all of them with `execute` and hands every test its own result.
+    Only tests waiting at the same time join a group, so a group never outgrows the number of threads.
+    """
+
+    # not a test class, despite the name
+    __test__ = False
+
+    def __init__(self, window: float, max_size: int = 50):
+        self.window = window
+        self.max_size = max(int(max_size), 1)
+        self._open: Dict[Hashable, _Batch] = {}
+        self._condition = threading.Condition()
+
+    def run(self, key: Hashable, sql: str, execute: Callable[[List[str]], List[Any]]) -> Any:
+        with self._condition:
+            batch = self._open.get(key)
+            leader = batch is None
+            if batch is None:
+                batch = self._open[key] = _Batch()
+            index = len(batch.sqls)
+            batch.sqls.append(sql)
+            if len(batch.sqls) >= self.max_size:
+                # full, tests arriving later start a new group
+                del self._open[key]
+                self._condition.notify_all()
+
+        if leader:
+            with self._condition:
+                self._condition.wait_for(lambda: self._open.get(key) is not batch, timeout=self.window)
+                if self._open.get(key) is batch:
+                    del self._open[key]
+            try:
+                batch.results = execute(list(batch.sqls))
+            except BaseException as e:
+                batch.error = e
+            finally:
+                batch.done.set()
+        else:
+            batch.done.wait()
+
+        if batch.error is not None:
+            raise batch.error
+        return batch.results[index]
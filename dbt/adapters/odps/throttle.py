@@ -0,0 +1,57 @@
+import threading
+from contextlib import contextmanager
+from typing import Optional
+
+from dbt.adapters.odps.utils import logger
+
+# ramp up again once instances start within this share of the threshold
+FAST_START_RATIO = 0.2
+
+
+class AdaptiveThrottle(object):
+    """
+    Limits how many statements are in flight at once, shared by every thread of the adapter.
+
+    The limit halves when our instances mostly wait in the ODPS queue, and grows by one
+    when they start promptly, between 1 and `max_limit`.
+    """
+
+    def __init__(self, max_limit: int, queue_wait_threshold: float = 30.0):
+        self.max_limit = max(int(max_limit), 1)
+        self.limit = self.max_limit
+        self.in_flight = 0
+        self.queue_wait_threshold = queue_wait_threshold
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            while self.in_flight >= self.limit:
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self, queue_seconds: Optional[float] = None):
+        with self._condition:
+            self.in_flight -= 1
+            if queue_seconds is not None:
+                self._adjust(queue_seconds)
+            self._condition.notify_all()
+
+    def _adjust(self, queue_seconds: float):
+        limit = self.limit
+        if queue_seconds >= self.queue_wait_threshold:
+            limit = max(1, limit // 2)
+        elif queue_seconds <= self.queue_wait_threshold * FAST_START_RATIO:
+            limit = min(self.max_limit, limit + 1)
+        if limit != self.limit:
+            logger.debug(f"Queue wait {queue_seconds:.1f}s, concurrent statements limit {self.limit} -> {limit}")
+            self.limit = limit
+
+    @contextmanager
+    def slot(self):
+        """Hold a slot while the statement runs, yield a dict to report the queue wait through"""
+        report = {}
+        self.acquire()
+        try:
+            yield report
+        finally:
+            self.release(report.get("queue_seconds"))
@@ -1,4 +1,6 @@
 import ast
+import hashlib
+import json
 import re
 
 from dbt.events import AdapterLogger
@@ -35,19 +37,150 @@ def remove_comments(input_string):
 
 
 def parse_hints(input_string):
-    pattern = re.compile(r'^set\s*(\S+)\s*=\s*(\S+)\s*;')
+    pattern = re.compile(r'^set\s*(\S+)\s*=\s*(\S+)\s*;', re.IGNORECASE)
     lines = []
     hints = {}
     for line in input_string.splitlines():
         trimmed = line.strip()
         find = re.match(pattern, trimmed)
         if find:
-            hints[find.group(1)] = ast.literal_eval(find.group(2))
+            try:
+                hints[find.group(1)] = ast.literal_eval(find.group(2))
+            except (ValueError, SyntaxError):
+                # odps style literals such as `true` or `2g`
+                hints[find.group(1)] = find.group(2)
         else:
             lines.append(line)
     return hints, "\n".join(lines)
 
+
+def format_hints(hints):
+    """Hints are sent to odps as strings, booleans in odps style"""
+    return {
+        key: str(value).lower() if isinstance(value, bool) else str(value)
+        for key, value in (hints or {}).items()
+    }
+
+
+QUERY_KEYWORDS = ("select", "with", "show", "desc", "describe", "explain")
+
+_CTE_NAME = re.compile(r"\s*(recursive\s+)?`?\w+`?\s*", re.IGNORECASE)
+_CTE_AS = re.compile(r"\s*as\s*", re.IGNORECASE)
+
+
+def _skip_parentheses(sql, start):
+    """Index after the parenthesized block opening at `start`, quoted text aside; none when unbalanced"""
+    depth, quote = 0, None
+    for index in range(start, len(sql)):
+        char = sql[index]
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in "'\"`":
+            quote = char
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+            if depth == 0:
+                return index + 1
+    return None
+
+
+def main_statement(sql):
+    """The statement after its `with` list of common table expressions, the sql itself when it has none or it can't be parsed"""
+    sql = sql.strip()
+    if not re.match(r"with\b", sql, re.IGNORECASE):
+        return sql
+    position = 4
+    while True:
+        name = _CTE_NAME.match(sql, position)
+        if not name:
+            return sql
+        position = name.end()
+        if sql.startswith("(", position):
+            # column list
+            position = _skip_parentheses(sql, position)
+            if position is None:
+                return sql
+        keyword = _CTE_AS.match(sql, position)
+        if not keyword or not sql.startswith("(", keyword.end()):
+            return sql
+        position = _skip_parentheses(sql, keyword.end())
+        if position is None:
+            return sql
+        rest = sql[position:].lstrip()
+        if not rest.startswith(","):
+            return rest
+        position = len(sql) - len(rest) + 1
+
+
+def _first_word(sql):
+    words = sql.strip().split(None, 1)
+    return words[0].lower().rstrip(";") if words else ""
+
+
+def is_query(sql):
+    """Whether the statement only reads, so its result is needed right away"""
+    return _first_word(main_statement(sql)) in QUERY_KEYWORDS
+
+
+_IDEMPOTENT = re.compile(
+    r"^(insert\s+overwrite\b"
+    r"|create\s+or\s+replace\b"
+    r"|(create|drop)\s+(\w+\s+){1,3}if\s+(not\s+)?exists\b"
+    r"|alter\s+table\s+\S+\s+(add|drop)\s+if\s+(not\s+)?exists\s+partition\b)",
+    re.IGNORECASE,
+)
+
+
+def is_idempotent(sql):
+    """Whether running the statement twice leaves the same result, so it can be resubmitted after a failure"""
+    statement = main_statement(sql)
+    if _first_word(statement) == "with":
+        # a `with` list we couldn't read past may lead to anything
+        return False
+    return is_query(statement) or bool(_IDEMPOTENT.match(statement))
+
+
+def is_select(sql):
+    """Whether the statement is a plain select, the only kind query acceleration runs"""
+    return _first_word(main_statement(sql)) == "select"
+
+
+def normalize_sql(sql):
+    """The sql as ODPS stores it (set hints and comments aside), whitespace collapsed for comparison"""
+    _, sql = parse_hints(sql)
+    return re.sub(r"\s+", " ", remove_comments(sql)).strip().rstrip(";").strip()
+
+
+def fingerprint(sql, modified_times, config=None):
+    """Digest of a model's sql, the data versions of the relations it reads and the config shaping its table"""
+    digest = hashlib.sha256(sql.strip().encode("utf-8"))
+    for name in sorted(modified_times):
+        digest.update(f"\n{name}={modified_times[name].isoformat()}".encode("utf-8"))
+    if config:
+        digest.update(f"\n{json.dumps(config, sort_keys=True, default=str)}".encode("utf-8"))
+    return digest.hexdigest()
+
 # 示例用法
 # input_string = "This is a /* comment */ example"
 # output_string = remove_comments(input_string)
 # print(output_string)
+
+
+def cluster_layout_matches(actual, expected):
+    """Whether a table's clustering is the layout configured, both as built by the `odps__cluster_layout` macro"""
+    if actual is None or expected is None:
+        return actual is None and expected is None
+
+    def keys(layout):
+        return [(key["name"].lower(), key["order"].lower()) for key in layout["sorted_by"]]
+
+    return (
+        actual["type"] == expected["type"]
+        and [c.lower() for c in actual["columns"]] == [c.lower() for c in expected["columns"]]
+        and keys(actual) == keys(expected)
+        # range clustering picks its own bucket count unless one is configured
+        and (expected["buckets"] is None or actual["buckets"] == expected["buckets"])
+    )
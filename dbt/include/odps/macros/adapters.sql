@@ -84,6 +84,21 @@
 {%- endmacro -%}
 
 
+{% macro partition_field_names() %}
+  {%- set cols = config.get('partition_by', validator=validation.any[list, basestring]) -%}
+  {%- set names = [] -%}
+  {%- if cols is not none -%}
+    {%- if cols is mapping -%}
+      {%- set cols = [cols] -%}
+    {%- endif -%}
+    {%- for item in cols -%}
+      {%- do names.append(item.field) -%}
+    {%- endfor -%}
+  {%- endif -%}
+  {{ return(names) }}
+{%- endmacro -%}
+
+
 {% macro partition_clause() %}
   {%- set cols = config.get('partition_by', validator=validation.any[list, basestring]) -%}
   {%- if cols is not none %}
@@ -100,19 +115,65 @@
 {%- endmacro -%}
 
 
-{% macro clustered_cols(label, required=false) %}
+{#-- Table layout from the `clustered_by`, `cluster_type`, `sorted_by` and `buckets` configs,
+     none when the model is not clustered --#}
+{% macro odps__cluster_layout() %}
   {%- set cols = config.get('clustered_by', validator=validation.any[list, basestring]) -%}
+  {%- set sorted_by = config.get('sorted_by', validator=validation.any[list, basestring]) -%}
+  {%- if cols is none -%}
+    {%- if sorted_by is not none -%}
+      {%- do exceptions.raise_compiler_error("`sorted_by` requires `clustered_by`") -%}
+    {%- endif -%}
+    {{ return(none) }}
+  {%- endif -%}
+  {%- set cols = [cols] if cols is string else cols -%}
+  {%- set sorted_by = [sorted_by] if sorted_by is string else (sorted_by or []) -%}
+
+  {%- set cluster_type = config.get('cluster_type', 'hash') | lower -%}
+  {%- if cluster_type not in ('hash', 'range') -%}
+    {%- do exceptions.raise_compiler_error("Invalid cluster_type: " ~ cluster_type ~ ", expected one of: 'hash', 'range'") -%}
+  {%- endif -%}
   {%- set buckets = config.get('buckets', validator=validation.any[int]) -%}
-  {%- if (cols is not none) and (buckets is not none) %}
-    {%- if cols is string -%}
-      {%- set cols = [cols] -%}
+  {%- if cluster_type == 'hash' and buckets is none -%}
+    {#-- earlier versions ignored such a config, keep building the table unclustered --#}
+    {%- do exceptions.warn("Hash clustering by " ~ cols | join(', ') ~ " requires `buckets`, "
+                           ~ model.unique_id ~ " is built unclustered") -%}
+    {{ return(none) }}
+  {%- endif -%}
+
+  {%- set sort_keys = [] -%}
+  {%- for item in sorted_by -%}
+    {%- set parts = item.split() -%}
+    {%- set order = parts[1] | lower if parts | length > 1 else 'asc' -%}
+    {%- if parts | length > 2 or order not in ('asc', 'desc') -%}
+      {%- do exceptions.raise_compiler_error("Invalid sorted_by key: " ~ item ~ ", expected `column [asc|desc]`") -%}
     {%- endif -%}
-    {{ label }} (
-    {%- for item in cols -%}
-      {{ item }}
-      {%- if not loop.last -%},{%- endif -%}
-    {%- endfor -%}
-    ) into {{ buckets }} buckets
+    {%- do sort_keys.append({'name': parts[0], 'order': order}) -%}
+  {%- endfor -%}
+
+  {#-- partition columns are constant within a partition, they can't cluster or sort it --#}
+  {%- set partition_fields = partition_field_names() | map('lower') | list -%}
+  {%- for name in cols + sort_keys | map(attribute='name') | list -%}
+    {%- if name | lower in partition_fields -%}
+      {%- do exceptions.raise_compiler_error("Partition column " ~ name ~ " can't be used in `clustered_by` or `sorted_by`") -%}
+    {%- endif -%}
+  {%- endfor -%}
+
+  {{ return({'type': cluster_type, 'columns': cols, 'sorted_by': sort_keys, 'buckets': buckets}) }}
+{%- endmacro -%}
+
+
+{% macro clustered_cols(label) %}
+  {%- set layout = odps__cluster_layout() -%}
+  {%- if layout is not none %}
+    {{ 'range ' if layout.type == 'range' }}{{ label }} ({{ layout.columns | join(', ') }})
+    {%- if layout.sorted_by %} sorted by (
+      {%- for key in layout.sorted_by -%}
+        {{ key.name }} {{ key.order }}{%- if not loop.last -%}, {% endif -%}
+      {%- endfor -%}
+    )
+    {%- endif -%}
+    {%- if layout.buckets is not none %} into {{ layout.buckets }} buckets{%- endif -%}
   {%- endif %}
 {%- endmacro -%}
 
@@ -123,6 +184,31 @@
   {% do return(load_result('list_properties').table) %}
 {%- endmacro %}
 
+{#-- Value of one table property, none when it is not set --#}
+{% macro odps__get_tbl_property(relation, key) -%}
+  {%- for row in fetch_tbl_properties(relation) -%}
+    {%- if row | length > 1 -%}
+      {%- set name, value = row[0], row[1] -%}
+    {%- else -%}
+      {%- set name, _, value = (row[0] | string).partition('=') -%}
+    {%- endif -%}
+    {%- if (name | string | trim) == key -%}
+      {{ return(value | string | trim) }}
+    {%- endif -%}
+  {%- endfor -%}
+  {{ return(none) }}
+{%- endmacro %}
+
+{% macro odps__set_tbl_properties(relation, properties) -%}
+  {% call statement('set_tbl_properties') -%}
+    alter table {{ relation }} set tblproperties (
+      {%- for key, value in properties.items() -%}
+        "{{ key }}" = "{{ value }}"{%- if not loop.last -%}, {% endif -%}
+      {%- endfor -%}
+    )
+  {%- endcall %}
+{%- endmacro %}
+
 {% macro create_temporary_view(relation, sql) -%}
   --  We can't use temporary tables with `create ... as ()` syntax in Hive2
   -- create temporary view {{ relation.include(schema=false) }} as
@@ -139,6 +225,8 @@
 
 
   {% set is_external = config.get('external') -%}
+  {#-- clustered tables only take insert overwrite --#}
+  {%- set insert_into = 'insert into' if odps__cluster_layout() is none else 'insert overwrite table' -%}
   {%- set table_type = config.get('table_type') -%}
   {%- if temporary -%}
     {{ create_temporary_view(relation, sql) }}
@@ -164,11 +252,11 @@
 
       {{ get_assert_columns_equivalent(sql) }}
       {%- set sql = get_select_subquery(sql) %}
-      insert into {{ relation }} {{ partition_cols(label="partition") }}
+      {{ insert_into }} {{ relation }} {{ partition_cols(label="partition") }}
       (
           {{ sql }}
       );
-    {% elif config.get('partition_by') %}
+    {% elif config.get('partition_by') or odps__cluster_layout() is not none %}
       {# set odps.sql.submit.mode='script'; #}
        {% call statement('create_table', auto_begin=False) -%}
 
@@ -187,7 +275,7 @@
       ;
 
       {% endcall %}
-      insert into {{ relation }} {{ partition_cols(label="partition") }}
+      {{ insert_into }} {{ relation }} {{ partition_cols(label="partition") }}
       (
           {{ sql }}
       );
@@ -230,6 +318,39 @@
   {%- endcall %}
 {% endmacro %}
 
+{% macro odps__alter_relation_add_remove_columns(relation, add_columns, remove_columns) -%}
+  {%- if add_columns -%}
+    {%- do alter_relation_add_columns(relation, add_columns) -%}
+  {%- endif -%}
+  {%- if remove_columns -%}
+    {%- do alter_relation_drop_columns(relation, remove_columns) -%}
+  {%- endif -%}
+{% endmacro %}
+
+{% macro alter_relation_add_columns(relation, add_columns) -%}
+  {% call statement('alter_relation_add_columns') -%}
+    alter table {{ relation }} add columns (
+      {%- for column in add_columns %}
+      {{ column.name }} {{ column.dtype }}{{ "," if not loop.last }}
+      {%- endfor %}
+    )
+  {%- endcall %}
+{% endmacro %}
+
+{% macro alter_relation_change_columns(relation, new_target_types) -%}
+  {%- for change in new_target_types %}
+    {% call statement('alter_relation_change_columns') -%}
+      alter table {{ relation }} change column {{ change['column_name'] }} {{ change['column_name'] }} {{ change['new_type'] }}
+    {%- endcall %}
+  {%- endfor %}
+{% endmacro %}
+
+{% macro alter_relation_drop_columns(relation, remove_columns) -%}
+  {% call statement('alter_relation_drop_columns') -%}
+    alter table {{ relation }} drop columns {{ remove_columns | map(attribute='name') | join(', ') }}
+  {%- endcall %}
+{% endmacro %}
+
 {% macro show_create_table(relation) %}
   {% call statement('show_create_table', fetch_result=True) -%}
     show create table {{ relation }}
@@ -267,7 +388,7 @@
   {%- endif %}
 
   {#-- Obtain the column schema provided by sql file. #}
-  {%- set sql_file_provided_columns = get_column_schema_from_query(sql, config.get('sql_header', none)) -%}
+  {%- set sql_file_provided_columns = adapter.get_column_schema_from_query(get_empty_subquery_sql(sql, config.get('sql_header', none)), odps__upstream_relations()) -%}
   {%- set columns = [] -%}
   {%- for c in sql_file_provided_columns -%}
     {%- if c.name not in partition_col_names -%}
@@ -317,7 +438,7 @@
   {%- endif %}
 
   {#-- Obtain the column schema provided by sql file. #}
-  {%- set sql_file_provided_columns = get_column_schema_from_query(sql, config.get('sql_header', none)) -%}
+  {%- set sql_file_provided_columns = adapter.get_column_schema_from_query(get_empty_subquery_sql(sql, config.get('sql_header', none)), odps__upstream_relations()) -%}
   {#--Obtain the column schema provided by the schema file by generating an 'empty schema' query from the model's columns. #}
   {%- set schema_file_provided_columns = get_column_schema_from_query(get_empty_schema_sql(user_defined_columns)) -%}
 
@@ -0,0 +1,59 @@
+{#-- Relations the model reads, looking through ephemeral models --#}
+{% macro odps__upstream_relations(node=none) %}
+  {%- set node = model if node is none else node -%}
+  {%- set relations = [] -%}
+  {%- for unique_id in node.depends_on.nodes -%}
+    {%- set upstream = graph.nodes.get(unique_id) or graph.sources.get(unique_id) -%}
+    {%- if upstream is none -%}
+      {%- do log("Upstream " ~ unique_id ~ " not found in the graph") -%}
+    {%- elif upstream.config.materialized == 'ephemeral' -%}
+      {%- do relations.extend(odps__upstream_relations(upstream)) -%}
+    {%- else -%}
+      {%- do relations.append(api.Relation.create(
+          database=upstream.database,
+          schema=upstream.schema,
+          identifier=upstream.identifier if upstream.resource_type == 'source' else upstream.alias)) -%}
+    {%- endif -%}
+  {%- endfor -%}
+  {{ return(relations) }}
+{% endmacro %}
+
+
+{#-- Fingerprint to store on the built table when `skip_unchanged` is on, none otherwise --#}
+{% macro odps__model_fingerprint() %}
+  {%- if not adapter.skip_unchanged_enabled(config.get('skip_unchanged')) -%}
+    {{ return(none) }}
+  {%- endif -%}
+  {#-- a change of the table's shape or options rebuilds it too --#}
+  {%- set table_config = {'contract': config.get('contract').enforced} -%}
+  {%- for key in ('materialized', 'partition_by', 'clustered_by', 'cluster_type', 'sorted_by', 'buckets',
+                  'lifecycle', 'tbl_properties', 'table_type', 'external', 'file_format', 'location',
+                  'sql_header', 'grants', 'on_rebuild', 'incremental_strategy', 'unique_key', 'on_schema_change') -%}
+    {%- do table_config.update({key: config.get(key)}) -%}
+  {%- endfor -%}
+  {{ return(adapter.model_fingerprint(sql, odps__upstream_relations(), table_config)) }}
+{% endmacro %}
+
+
+{#-- A table rebuilt without a fingerprint must not keep the one of an earlier build --#}
+{% macro odps__clear_fingerprint(relation) %}
+  {%- if odps__get_tbl_property(relation, 'dbt.fingerprint') -%}
+    {% do odps__set_tbl_properties(relation, {'dbt.fingerprint': ''}) %}
+  {%- endif -%}
+{% endmacro %}
+
+
+{#-- Whether the existing table was built from the same sql and upstream data --#}
+{% macro odps__is_unchanged(existing_relation, fingerprint) %}
+  {%- if fingerprint is none or existing_relation is none or not existing_relation.is_table or should_full_refresh() -%}
+    {{ return(false) }}
+  {%- endif -%}
+  {{ return(odps__get_tbl_property(existing_relation, 'dbt.fingerprint') == fingerprint) }}
+{% endmacro %}
+
+
+{% macro odps__skip_unchanged(target_relation) %}
+  {%- do log("Skip " ~ target_relation ~ ", its sql and upstream data are unchanged", info=true) -%}
+  {%- do store_result('main', response=adapter.unchanged_response()) -%}
+  {{ return({'relations': [target_relation]}) }}
+{% endmacro %}
@@ -19,6 +19,13 @@
   -- relations
   {%- set existing_relation = load_cached_relation(this) -%}
   {%- set target_relation = this.incorporate(type='table') -%}
+
+  -- with skip_unchanged, a table built from the same sql and upstream data is left as is
+  {%- set fingerprint = odps__model_fingerprint() -%}
+  {%- if odps__is_unchanged(existing_relation, fingerprint) -%}
+    {{ return(odps__skip_unchanged(target_relation)) }}
+  {%- endif -%}
+
   {%- set temp_relation = make_temp_relation(target_relation)-%}
   {%- set intermediate_relation = make_intermediate_relation(target_relation)-%}
   {%- set backup_relation_type = 'table' if existing_relation is none else existing_relation.type -%}
@@ -39,12 +46,17 @@
 
   {#-- For non-partition tables insert overwrite is not supported --#}
   {%- set partitioned_by = config.get('partition_by') -%}
-  {%- if incremental_strategy == 'insert_overwrite' -%}
+  {%- if incremental_strategy in ('insert_overwrite', 'microbatch', 'merge_overwrite') -%}
     {%- if partitioned_by is none -%}
-      {%- do exceptions.raise_compiler_error("insert_overwrite strategy is not supported for non-partition tables") -%}
+      {%- do exceptions.raise_compiler_error(incremental_strategy ~ " strategy is not supported for non-partition tables") -%}
       {{ return(None) }}
     {%- endif -%}
   {%- endif -%}
+  {#-- clustered tables only take insert overwrite --#}
+  {%- if incremental_strategy in ('append', 'delete+insert') and odps__cluster_layout() is not none -%}
+    {%- do exceptions.raise_compiler_error(incremental_strategy ~ " strategy inserts into the table, which clustered tables don't support."
+                                           ~ " Use insert_overwrite or merge_overwrite") -%}
+  {%- endif -%}
 
 
   -- the temp_ and backup_ relations should not already exist in the database; get_relation
@@ -63,29 +75,76 @@
   -- `BEGIN` happens here:
   {{ run_hooks(pre_hooks, inside_transaction=True) }}
 
+  -- tests with `test_partitions: written` check the partitions changed after this point
+  {%- set record_written = config.get('test_partitions') == 'written' and partitioned_by is not none -%}
+  {%- set statistics_of_written = config.get('collect_statistics') == 'partitions' and partitioned_by is not none -%}
+  {%- if record_written or statistics_of_written -%}
+    {%- set written_after = 0 if existing_relation is none or full_refresh_mode
+                            else adapter.get_data_modified_time(target_relation) -%}
+  {%- endif %}
+
+  -- with submit_mode 'script', DDL/DML below is submitted as one script instance
+  {% do adapter.begin_script(config.get('submit_mode')) %}
+
   {% set to_drop = [] %}
 
     {%- do log("exist relation " ~ existing_relation ~ ", full_refresh_mode: " ~ full_refresh_mode ) -%}
 
-  {% if existing_relation is none %}
+  {% if incremental_strategy == 'microbatch' and (existing_relation is none or full_refresh_mode) %}
+      {#-- the backfill of a first build or full refresh runs batch by batch too, into an empty table --#}
+      {% set build_relation = target_relation if existing_relation is none else intermediate_relation %}
+      {% call statement('create_empty') %}
+        {{ get_create_table_as_sql(False, build_relation, odps__empty_query(sql)) }}
+      {% endcall %}
+      {% set build_response = odps__microbatch(build_relation, sql, full_build=true, resume_relation=target_relation) %}
+      {% set need_swap = existing_relation is not none %}
+  {% elif existing_relation is none %}
       {% set build_sql = get_create_table_as_sql(False, target_relation, sql) %}
   {% elif full_refresh_mode %}
       {% set build_sql = get_create_table_as_sql(False, intermediate_relation, sql) %}
       {% set need_swap = true %}
   {% else %}
-    {# 暂时只支持 insert_overwrite 策略，并且 on_schema_change 只支持 fail #}
+    {#-- append_new_columns / sync_all_columns evolve the target first, the sql is aligned to it --#}
+    {% set sql = odps__process_schema_changes(on_schema_change, sql, target_relation) %}
     {#-- Get the incremental_strategy, the macro to use for the strategy, and build the sql --#}
     {% if incremental_strategy == 'insert_overwrite' -%}
-      {% set build_sql = get_insert_overwrite_sql(temp_relation, target_relation, sql) %}
+      {% set partitions = odps__partitions_to_replace() %}
+      {% if partitions is not none %}
+        {% set build_response = odps__insert_overwrite_partitions(target_relation, sql, partitions) %}
+      {% else %}
+        {% set build_sql = get_insert_overwrite_sql(temp_relation, target_relation, sql) %}
+      {% endif %}
+    {% elif incremental_strategy == 'microbatch' -%}
+      {% set build_response = odps__microbatch(target_relation, sql) %}
+    {% elif incremental_strategy == 'delete+insert' -%}
+      {% do odps__create_staging_table(temp_relation, sql) %}
+      {% do to_drop.append(temp_relation) %}
+      {% set dest_columns = adapter.get_columns_in_relation(target_relation)
+                            + adapter.get_partition_columns_in_relation(target_relation) %}
+      {% set statements = odps__get_delete_insert_sql(temp_relation, target_relation, unique_key, dest_columns) %}
+      {% set build_response = adapter.execute_script(statements) %}
     {% else %}
-      {% set build_sql = get_insert_into_sql(temp_relation, target_relation, sql) %}
-    {% endif %}  
+      {% set dest_columns = none %}
+      {% if incremental_strategy in ('merge', 'merge_overwrite') %}
+        {% do odps__create_staging_table(temp_relation, sql) %}
+        {% do to_drop.append(temp_relation) %}
+        {% set dest_columns = adapter.get_columns_in_relation(target_relation)
+                              + adapter.get_partition_columns_in_relation(target_relation) %}
+      {% endif %}
+      {% set build_sql = dbt_odps_get_incremental_sql(incremental_strategy, temp_relation, target_relation,
+                                                      unique_key, dest_columns, sql,
+                                                      config.get('incremental_predicates')) %}
+    {% endif %}
 
   {% endif %}
 
-  {% call statement("main") %}
-      {{ build_sql }}
-  {% endcall %}
+  {% if build_response is defined %}
+    {% do store_result('main', response=build_response) %}
+  {% else %}
+    {% call statement("main") %}
+        {{ build_sql }}
+    {% endcall %}
+  {% endif %}
 
   {% if need_swap %}
       {% do adapter.rename_relation(target_relation, backup_relation) %}
@@ -111,6 +170,20 @@
       {% do adapter.drop_relation(rel) %}
   {% endfor %}
 
+  {% if fingerprint is not none %}
+    {% do odps__set_tbl_properties(target_relation, {'dbt.fingerprint': fingerprint}) %}
+  {% elif existing_relation is not none and existing_relation.is_table and not need_swap %}
+    {#-- the table was loaded in place and keeps its properties --#}
+    {% do odps__clear_fingerprint(target_relation) %}
+  {% endif %}
+  {% if record_written %}
+    {% do odps__set_tbl_properties(target_relation, {'dbt.written_after': written_after}) %}
+  {% endif %}
+
+  {% do adapter.end_script() %}
+
+  {% do odps__collect_statistics(target_relation, written_after if statistics_of_written else none) %}
+
   {{ run_hooks(post_hooks, inside_transaction=False) }}
 
   {{ return({'relations': [target_relation]}) }}
@@ -9,40 +9,89 @@
 {%- endmacro %}
 
 {% macro sync_column_schemas(on_schema_change, target_relation, schema_changes_dict) %}
-  {%- set partitioned_by = config.get('partitioned_by') -%}
-  {% set table_type = config.get('table_type') %}
-  {%- if partitioned_by is none -%}
-    {%- set partitioned_by = [] -%}
-  {%- endif %}
   {%- set add_to_target_arr = schema_changes_dict['source_not_in_target'] -%}
-  {%- if on_schema_change == 'append_new_columns'-%}
-    {%- if add_to_target_arr | length > 0 -%}
-      {%- do alter_relation_add_columns(target_relation, add_to_target_arr) -%}
+  {%- set remove_from_target_arr = schema_changes_dict['target_not_in_source'] -%}
+  {%- set new_target_types = schema_changes_dict['new_target_types'] -%}
+
+  {#-- only widening type changes are done in place, anything else needs a full refresh --#}
+  {%- set narrowing = [] -%}
+  {%- for change in new_target_types -%}
+    {%- set target_column = schema_changes_dict['target_columns'] | selectattr('name', 'equalto', change['column_name']) | first -%}
+    {%- if not target_column.can_widen_to(change['new_type']) -%}
+      {%- do narrowing.append(change['column_name'] ~ ': ' ~ target_column.dtype ~ ' -> ' ~ change['new_type']) -%}
     {%- endif -%}
-  {% elif on_schema_change == 'sync_all_columns' %}
-    {%- set remove_from_target_arr = schema_changes_dict['target_not_in_source'] -%}
-    {%- set new_target_types = schema_changes_dict['new_target_types'] -%}
-    {% if add_to_target_arr | length > 0 %}
-      {%- do alter_relation_add_columns(target_relation, add_to_target_arr) -%}
-    {% endif %}
+  {%- endfor -%}
+  {%- if on_schema_change == 'sync_all_columns' and narrowing -%}
+    {%- do exceptions.raise_compiler_error(
+        "Column types of " ~ target_relation ~ " can't be changed in place: " ~ narrowing | join(', ')
+        ~ ". Re-run the model with `full_refresh: True`.") -%}
+  {%- endif -%}
+
+  {%- if add_to_target_arr | length > 0 -%}
+    {%- do alter_relation_add_columns(target_relation, add_to_target_arr) -%}
+  {%- endif -%}
+  {% if on_schema_change == 'sync_all_columns' %}
     {% if new_target_types | length > 0 %}
       {%- do alter_relation_change_columns(target_relation, new_target_types) -%}
     {% endif %}
-    {%- set replace_with_target_arr = remove_partitions_from_columns(schema_changes_dict['source_columns'], partitioned_by) -%}
-    {% if remove_from_target_arr | length > 0 and table_type == 'iceberg' %}
-      {%- do alter_relation_replace_columns(target_relation, replace_with_target_arr) -%}
+    {% if remove_from_target_arr | length > 0 %}
+      {%- do alter_relation_drop_columns(target_relation, remove_from_target_arr) -%}
     {% endif %}
   {% endif %}
   {% set schema_change_message %}
     In {{ target_relation }}:
       Schema change approach: {{ on_schema_change }}
       Columns added: {{ add_to_target_arr }}
+    {%- if on_schema_change == 'sync_all_columns' %}
       Columns removed: {{ remove_from_target_arr }}
       Data types changed: {{ new_target_types }}
-    {%- set remove_from_target_arr = schema_changes_dict['target_not_in_source'] -%}
-    {% if on_schema_change == 'sync_all_columns' and table_type != 'iceberg' and remove_from_target_arr | length > 0 %}
-      Columns removed: {{ remove_from_target_arr }}. Please take appropriate action for these columns on destination table.
-    {% endif %}
+    {%- endif %}
   {% endset %}
   {% do log(schema_change_message) %}
 {% endmacro %}
+
+
+{#-- Evolve the target schema for `append_new_columns` / `sync_all_columns`,
+     returns the model sql with its columns in the order and types of the target --#}
+{% macro odps__process_schema_changes(on_schema_change, sql, target_relation) %}
+  {%- if on_schema_change not in ('append_new_columns', 'sync_all_columns') -%}
+    {{ return(sql) }}
+  {%- endif -%}
+
+  {%- set source_columns = odps__get_columns_from_query(sql) -%}
+  {%- set target_columns = adapter.get_columns_in_relation(target_relation) -%}
+  {%- set schema_changes_dict = {
+      'source_columns': source_columns,
+      'target_columns': target_columns,
+      'source_not_in_target': diff_columns(source_columns, target_columns),
+      'target_not_in_source': diff_columns(target_columns, source_columns),
+      'new_target_types': diff_column_data_types(source_columns, target_columns),
+  } -%}
+  {%- if not (schema_changes_dict['source_not_in_target'] or schema_changes_dict['target_not_in_source']
+              or schema_changes_dict['new_target_types']) -%}
+    {{ return(sql) }}
+  {%- endif -%}
+
+  {% do sync_column_schemas(on_schema_change, target_relation, schema_changes_dict) %}
+
+  {%- set source_names = source_columns | map(attribute='name') | list -%}
+  {%- set select_list = [] -%}
+  {%- for column in adapter.get_columns_in_relation(target_relation) -%}
+    {%- if column.name in source_names -%}
+      {%- do select_list.append('cast(DBT_INTERNAL_SOURCE.' ~ column.name ~ ' as ' ~ column.dtype ~ ') as ' ~ column.name) -%}
+    {%- else -%}
+      {%- do select_list.append(column.literal('null') ~ ' as ' ~ column.name) -%}
+    {%- endif -%}
+  {%- endfor -%}
+  {%- for field in partition_field_names() -%}
+    {%- do select_list.append('DBT_INTERNAL_SOURCE.' ~ field) -%}
+  {%- endfor -%}
+
+  {%- set aligned_sql -%}
+    select {{ select_list | join(', ') }}
+    from (
+      {{ sql }}
+    ) DBT_INTERNAL_SOURCE
+  {%- endset -%}
+  {{ return(aligned_sql) }}
+{% endmacro %}
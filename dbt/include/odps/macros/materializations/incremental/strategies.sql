@@ -32,6 +32,184 @@
 {% endmacro %}
 
 
+{#-- Partitions to overwrite from `partitions_to_replace` or the rows of `partitions_query`, none when neither is set --#}
+{% macro odps__partitions_to_replace() %}
+  {%- set partitions = config.get('partitions_to_replace') -%}
+  {%- set partitions_query = config.get('partitions_query') -%}
+  {%- if partitions is none and partitions_query is none -%}
+    {{ return(none) }}
+  {%- endif -%}
+
+  {%- set specs = [] -%}
+  {%- if partitions is not none -%}
+    {%- if partitions is string or partitions is mapping -%}
+      {%- set partitions = [partitions] -%}
+    {%- endif -%}
+    {%- for partition in partitions -%}
+      {%- do specs.append(adapter.partition_spec(partition)) -%}
+    {%- endfor -%}
+  {%- else -%}
+    {%- set result = run_query(partitions_query) -%}
+    {%- for row in result.rows -%}
+      {%- set spec = {} -%}
+      {%- for column_name in result.column_names -%}
+        {%- do spec.update({column_name: row[column_name] | string}) -%}
+      {%- endfor -%}
+      {%- do specs.append(spec) -%}
+    {%- endfor -%}
+  {%- endif -%}
+  {{ return(specs) }}
+{% endmacro %}
+
+
+{#-- Overwrite exactly the given partitions, one instance per partition with the source pruned to it --#}
+{% macro odps__insert_overwrite_partitions(target_relation, sql, partitions) %}
+    {%- set sql_header = config.get('sql_header', none) %}
+    {%- set source_columns = odps__get_columns_from_query(sql) -%}
+    {%- set dest_columns = adapter.get_columns_in_relation(target_relation) -%}
+    {% do odps__assert_columns_equals(source_columns, dest_columns) %}
+
+    {%- set partition_fields = partition_field_names() -%}
+    {%- set statements = [] -%}
+    {%- set touched = [] -%}
+    {%- for partition in partitions -%}
+      {%- set values = {} -%}
+      {%- for key, value in partition.items() -%}
+        {%- if key | lower not in partition_fields | map('lower') | list -%}
+          {%- do exceptions.raise_compiler_error("Unknown partition column " ~ key ~ " in partition " ~ partition
+                                                  ~ ", expected one of: " ~ partition_fields | join(', ')) -%}
+        {%- endif -%}
+        {%- do values.update({key | lower: value}) -%}
+      {%- endfor -%}
+      {#-- in `partition_by` order, the given columns are static and must come first, the others stay dynamic --#}
+      {%- set static_specs = [] -%}
+      {%- set predicates = [] -%}
+      {%- set dynamic_fields = [] -%}
+      {%- for field in partition_fields -%}
+        {%- if field | lower not in values -%}
+          {%- do dynamic_fields.append(field) -%}
+        {%- elif dynamic_fields -%}
+          {%- do exceptions.raise_compiler_error("Partition " ~ partition ~ " sets " ~ field ~ " but not "
+                                                  ~ dynamic_fields | join(', ') ~ " before it in partition_by") -%}
+        {%- else -%}
+          {%- set value = escape_single_quotes(values[field | lower]) -%}
+          {%- do static_specs.append(field ~ "='" ~ value ~ "'") -%}
+          {%- do predicates.append("DBT_INTERNAL_SOURCE." ~ field ~ " = '" ~ value ~ "'") -%}
+        {%- endif -%}
+      {%- endfor -%}
+
+      {%- set statement -%}
+        {{ sql_header if sql_header is not none }}
+        insert overwrite table {{ target_relation }}
+        partition ({{ (static_specs + dynamic_fields) | join(', ') }})
+        select {{ get_qualified_columnnames_csv(source_columns, 'DBT_INTERNAL_SOURCE') }}
+          {%- for field in dynamic_fields %}, DBT_INTERNAL_SOURCE.{{ field }}{% endfor %}
+        from (
+          {{ sql }}
+        ) DBT_INTERNAL_SOURCE
+        where {{ predicates | join(' and ') }}
+      {%- endset -%}
+      {%- do statements.append(statement) -%}
+      {%- do touched.append(static_specs | join(',')) -%}
+    {%- endfor -%}
+
+    {%- do log('overwrite partitions: ' ~ touched | join('; ')) -%}
+    {{ return(adapter.execute_concurrently(statements, config.get('partition_concurrency', 4), touched)) }}
+{% endmacro %}
+
+
+{#-- Overwrite the event-time range batch by batch, batches run concurrently. A full build loads every batch
+     from `begin`, later runs reload the current batch and `lookback` batches before it (when `end` is not set),
+     or every batch from the first one a failed run didn't finish, recorded on `resume_relation`.
+     Batches filter the model output on `event_time`, so reading fewer source partitions per batch relies on
+     the filter being pushed down to the sources --#}
+{% macro odps__microbatch(target_relation, sql, full_build=false, resume_relation=none) %}
+    {%- set resume_relation = target_relation if resume_relation is none else resume_relation -%}
+    {%- set event_time = config.get('event_time') -%}
+    {%- if event_time is none or config.get('begin') is none -%}
+      {%- do exceptions.raise_compiler_error("microbatch strategy requires the `event_time` and `begin` configs") -%}
+    {%- endif -%}
+    {%- set batch_size = config.get('batch_size', 'day') -%}
+    {%- set time_format = config.get('event_time_format', '%Y%m%d') -%}
+    {%- set begin = modules.date.parse_date(config.get('begin') | string) -%}
+    {%- set end = config.get('end') -%}
+    {%- set rolling = end is none -%}
+    {%- set end = modules.date.parse_date(end | string) if end is not none else modules.date.today().add_days(1) -%}
+    {%- set batches = modules.date.batch_ranges(begin, end, batch_size) -%}
+
+    {%- set resume_key = 'dbt.microbatch.resume_from' -%}
+    {%- set resume_from = none -%}
+    {%- if not full_build and config.get('batch_resume', true) -%}
+      {%- set resume_from = odps__get_tbl_property(target_relation, resume_key) -%}
+    {%- endif -%}
+    {%- if resume_from -%}
+      {%- do log('Resuming microbatch of ' ~ target_relation ~ ' from ' ~ resume_from, info=True) -%}
+      {%- set resume_day = modules.date.parse_date(resume_from).format() -%}
+      {%- set remaining = [] -%}
+      {%- for batch in batches if batch[1].format() > resume_day -%}
+        {%- do remaining.append(batch) -%}
+      {%- endfor -%}
+      {%- set batches = remaining -%}
+    {%- elif not full_build and rolling -%}
+      {#-- the current batch and `lookback` batches before it, for late data --#}
+      {%- set lookback = config.get('lookback', 1) | int -%}
+      {%- if lookback < 0 -%}
+        {%- do exceptions.raise_compiler_error("microbatch `lookback` can't be negative") -%}
+      {%- endif -%}
+      {%- set batches = batches[-(lookback + 1):] -%}
+    {%- endif -%}
+
+    {%- set sql_header = config.get('sql_header', none) %}
+    {%- set source_columns = odps__get_columns_from_query(sql) -%}
+    {%- set dest_columns = adapter.get_columns_in_relation(target_relation) -%}
+    {% do odps__assert_columns_equals(source_columns, dest_columns) %}
+    {%- set partition_fields = partition_field_names() -%}
+
+    {%- set statements = [] -%}
+    {%- set labels = [] -%}
+    {%- for batch_start, batch_end in batches -%}
+      {%- set statement -%}
+        {{ sql_header if sql_header is not none }}
+        insert overwrite table {{ target_relation }}
+        partition ({{ partition_fields | join(', ') }})
+        select {{ get_qualified_columnnames_csv(source_columns, 'DBT_INTERNAL_SOURCE') }}
+          {%- for field in partition_fields %}, DBT_INTERNAL_SOURCE.{{ field }}{% endfor %}
+        from (
+          {{ sql }}
+        ) DBT_INTERNAL_SOURCE
+        where DBT_INTERNAL_SOURCE.{{ event_time }} >= '{{ batch_start.format(time_format) }}'
+          and DBT_INTERNAL_SOURCE.{{ event_time }} < '{{ batch_end.format(time_format) }}'
+      {%- endset -%}
+      {%- do statements.append(statement) -%}
+      {%- do labels.append(batch_start.format(time_format)) -%}
+    {%- endfor -%}
+
+    {%- set result = adapter.execute_batches(
+          statements, config.get('batch_concurrency', 4), labels, config.get('batch_retries', 1)) -%}
+    {%- if result.failed -%}
+      {%- set first_failed = batches[result.failed | min][0] -%}
+      {#-- under submit_mode script the buffer is dropped by the error below, submit it and write the resume point directly --#}
+      {%- do adapter.end_script() -%}
+      {%- do odps__set_tbl_properties(resume_relation, {resume_key: first_failed.to_date_string()}) -%}
+      {%- do exceptions.raise_database_error(
+            "Microbatch failed, next run resumes from " ~ first_failed.to_date_string() ~ ":\n"
+            ~ result.errors | join('\n')) -%}
+    {%- elif resume_from -%}
+      {%- do odps__set_tbl_properties(resume_relation, {resume_key: ''}) -%}
+    {%- endif -%}
+    {{ return(result.response) }}
+{% endmacro %}
+
+
+{#-- The query with its columns but no rows, to create the table a build loads batch by batch --#}
+{% macro odps__empty_query(sql) %}
+  select * from (
+    {{ sql }}
+  ) DBT_INTERNAL_SOURCE
+  where 1 = 0
+{% endmacro %}
+
+
 {% macro get_insert_into_sql(source_relation, target_relation, sql) %}
      {%- set sql_header = config.get('sql_header', none) %}
     {{ sql_header if sql_header is not none }}
@@ -49,6 +227,105 @@
 
 {% endmacro %}
 
+{#-- Model output stored once in a short-lived table, for strategies that read it more than once --#}
+{% macro odps__create_staging_table(relation, sql) %}
+  {%- set sql_header = config.get('sql_header', none) -%}
+  {% call statement('drop_staging_table') -%}
+    drop table if exists {{ relation }}
+  {%- endcall %}
+  {% call statement('create_staging_table') -%}
+    {{ sql_header if sql_header is not none }}
+    create table {{ relation }} lifecycle 1 as
+    {{ sql }}
+  {%- endcall %}
+{% endmacro %}
+
+
+{#-- Predicate on `alias` matching the partitions present in the source, none when the model is not partitioned --#}
+{% macro odps__source_partition_predicates(source_relation, alias) %}
+  {%- set fields = partition_field_names() -%}
+  {%- if not fields -%}
+    {{ return(none) }}
+  {%- endif -%}
+  {%- set result = run_query('select distinct ' ~ fields | join(', ') ~ ' from ' ~ source_relation) -%}
+  {%- set conditions = [] -%}
+  {%- for row in result.rows -%}
+    {%- set matches = [] -%}
+    {%- for field in fields -%}
+      {%- do matches.append(alias ~ '.' ~ field ~ " = '" ~ escape_single_quotes(row[loop.index0] | string) ~ "'") -%}
+    {%- endfor -%}
+    {%- do conditions.append('(' ~ matches | join(' and ') ~ ')') -%}
+  {%- endfor -%}
+  {{ return('(' ~ (conditions | join(' or ') if conditions else 'false') ~ ')') }}
+{% endmacro %}
+
+
+{#-- Join predicates between DBT_INTERNAL_SOURCE and DBT_INTERNAL_DEST on the unique key --#}
+{% macro odps__unique_key_predicates(unique_key) %}
+  {%- set keys = [unique_key] if unique_key is string else unique_key -%}
+  {%- set predicates = [] -%}
+  {%- for key in keys -%}
+    {%- do predicates.append('DBT_INTERNAL_SOURCE.' ~ key ~ ' = DBT_INTERNAL_DEST.' ~ key) -%}
+  {%- endfor -%}
+  {{ return(predicates) }}
+{% endmacro %}
+
+
+{#-- Upsert for non-transactional tables: rewrite the affected partitions with the new rows
+     plus the existing rows whose unique key is not in the new rows --#}
+{% macro odps__get_merge_overwrite_sql(source, target, unique_key, dest_columns) %}
+  {%- if not unique_key -%}
+    {%- do exceptions.raise_compiler_error("merge_overwrite strategy requires the `unique_key` config") -%}
+  {%- endif -%}
+  {%- set partition_predicate = odps__source_partition_predicates(source, 'DBT_INTERNAL_DEST') -%}
+  {%- set sql_header = config.get('sql_header', none) %}
+  {{ sql_header if sql_header is not none }}
+  insert overwrite table {{ target }}
+  {{ partition_cols(label="partition") }}
+  select {{ get_qualified_columnnames_csv(dest_columns, 'DBT_INTERNAL_SOURCE') }}
+  from {{ source }} DBT_INTERNAL_SOURCE
+  union all
+  select {{ get_qualified_columnnames_csv(dest_columns, 'DBT_INTERNAL_DEST') }}
+  from {{ target }} DBT_INTERNAL_DEST
+  left anti join {{ source }} DBT_INTERNAL_SOURCE
+    on {{ odps__unique_key_predicates(unique_key) | join(' and ') }}
+  where {{ partition_predicate }}
+{% endmacro %}
+
+
+{#-- delete+insert for transactional tables: both statements stay within the batch's partitions --#}
+{% macro odps__get_delete_insert_sql(source, target, unique_key, dest_columns) %}
+  {%- if not unique_key -%}
+    {%- do exceptions.raise_compiler_error("delete+insert strategy requires the `unique_key` config") -%}
+  {%- endif -%}
+  {%- set predicates = odps__unique_key_predicates(unique_key) -%}
+  {%- set partition_predicate = odps__source_partition_predicates(source, 'DBT_INTERNAL_DEST') -%}
+  {%- set partition_fields = partition_field_names() | map('lower') | list -%}
+  {%- set insert_columns = dest_columns | rejectattr('name', 'in', partition_fields) | list -%}
+
+  {%- set delete_sql -%}
+    delete from {{ target }} as DBT_INTERNAL_DEST
+    where exists (
+      select 1 from {{ source }} DBT_INTERNAL_SOURCE
+      where {{ predicates | join(' and ') }}
+    )
+    {%- if partition_predicate is not none %}
+      and {{ partition_predicate }}
+    {%- endif %}
+  {%- endset -%}
+
+  {%- set insert_sql -%}
+    insert into table {{ target }}
+    {{ partition_cols(label="partition") }}
+    select {{ get_qualified_columnnames_csv(insert_columns) }}
+      {%- for field in partition_fields %}, {{ field }}{% endfor %}
+    from {{ source }}
+  {%- endset -%}
+
+  {{ return([delete_sql, insert_sql]) }}
+{% endmacro %}
+
+
 {% macro get_qualified_columnnames_csv(columns, qualifier='') %}
     {% set quoted = [] %}
     {% for col in columns -%}
@@ -71,7 +348,14 @@
   {%- set predicates = [] if predicates is none else [] + predicates -%}
   {%- set merge_update_columns = config.get('merge_update_columns') -%}
   {%- set merge_exclude_columns = config.get('merge_exclude_columns') -%}
-  {%- set update_columns = get_merge_update_columns(merge_update_columns, merge_exclude_columns, dest_columns) -%}
+  {#-- partition columns locate the row, they can't be updated; update columns come quoted --#}
+  {%- set partition_fields = partition_field_names() | map('lower') | list -%}
+  {%- set update_columns = [] -%}
+  {%- for column_name in get_merge_update_columns(merge_update_columns, merge_exclude_columns, dest_columns) -%}
+    {%- if (column_name | replace('`', '') | lower) not in partition_fields -%}
+      {%- do update_columns.append(column_name) -%}
+    {%- endif -%}
+  {%- endfor -%}
 
   {% if unique_key %}
       {% if unique_key is sequence and unique_key is not mapping and unique_key is not string %}
@@ -111,18 +395,33 @@
 {% endmacro %}
 
 
-{% macro dbt_odps_get_incremental_sql(strategy, source, target, unique_key, dest_columns, sql) %}
+{% macro dbt_odps_get_incremental_sql(strategy, source, target, unique_key, dest_columns, sql, incremental_predicates=none) %}
 
 
   {%- if strategy == 'append' -%}
     {#-- insert new records into existing table, without updating or overwriting #}
-    {{ get_insert_into_sql(source, target, dest_columns) }}
+    {{ get_insert_into_sql(source, target, sql) }}
   {%- elif strategy == 'insert_overwrite' -%}
     {#-- insert statements don't like CTEs, so support them via a temp view #}
     {{ get_insert_overwrite_sql(source, target, sql) }}
   {%- elif strategy == 'merge' -%}
-  {#-- merge all columns with databricks delta - schema changes are handled for us #}
-    {{ get_merge_sql(target, source, unique_key, dest_columns, predicates=none) }}
+  {#-- merge into transactional tables, the target is pruned by the incremental predicates #}
+    {%- if incremental_predicates is none -%}
+      {%- set predicates = [] -%}
+    {%- elif incremental_predicates is string -%}
+      {%- set predicates = [incremental_predicates] -%}
+    {%- else -%}
+      {%- set predicates = [] + incremental_predicates -%}
+    {%- endif -%}
+    {%- if config.get('merge_prune_partitions', false) -%}
+      {%- set partition_predicate = odps__source_partition_predicates(source, 'DBT_INTERNAL_DEST') -%}
+      {%- if partition_predicate is not none -%}
+        {%- do predicates.append(partition_predicate) -%}
+      {%- endif -%}
+    {%- endif -%}
+    {{ get_merge_sql(target, source, unique_key, dest_columns, incremental_predicates=predicates) }}
+  {%- elif strategy == 'merge_overwrite' -%}
+    {{ odps__get_merge_overwrite_sql(source, target, unique_key, dest_columns) }}
   {%- else -%}
     {% set no_sql_for_strategy_msg -%}
       No known SQL for the incremental strategy provided: {{ strategy }}
@@ -37,7 +37,7 @@
 
   {% set invalid_strategy_msg -%}
     Invalid incremental strategy provided: {{ raw_strategy }}
-    Expected one of: 'append', 'merge', 'insert_overwrite'
+    Expected one of: 'append', 'merge', 'merge_overwrite', 'delete+insert', 'insert_overwrite', 'microbatch'
   {%- endset %}
 
   {% set invalid_insert_overwrite_endpoint_msg -%}
@@ -46,7 +46,7 @@
     Use the 'append' or 'merge' strategy instead
   {%- endset %}
 
-  {% if raw_strategy not in ['append', 'merge', 'insert_overwrite'] %}
+  {% if raw_strategy not in ['append', 'merge', 'merge_overwrite', 'delete+insert', 'insert_overwrite', 'microbatch'] %}
     {% do exceptions.raise_compiler_error(invalid_strategy_msg) %}
   {%-else %}
     {% if raw_strategy == 'insert_overwrite' and target.endpoint %}
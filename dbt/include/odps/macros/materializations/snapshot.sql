@@ -28,9 +28,123 @@
 {%- endmacro %}
 
 
+{#-- Initial build, snapshots partitioned by dbt_is_current start with every row current --#}
+{% macro odps__build_snapshot_table(strategy, sql) -%}
+    {%- set select = default__build_snapshot_table(strategy, sql) -%}
+    {%- if partition_field_names() | map('lower') | list == ['dbt_is_current'] -%}
+    select *, 'true' as dbt_is_current from (
+        {{ select }}
+    ) DBT_INTERNAL_SNAPSHOT
+    {%- else -%}
+    {{ select }}
+    {%- endif -%}
+{%- endmacro %}
+
+
+{#-- How an existing snapshot is updated:
+     'current_partition' when partitioned by dbt_is_current, only the current rows are rewritten,
+     'merge' on unpartitioned transactional tables, only the changed rows are written,
+     'overwrite' otherwise, the whole history is rewritten --#}
+{% macro odps__snapshot_update_mode(target) -%}
+    {%- set partitions = adapter.get_partition_columns_in_relation(target) | map(attribute='name') | map('lower') | list -%}
+    {%- if partitions == ['dbt_is_current'] -%}
+        {{ return('current_partition') }}
+    {%- elif not partitions and adapter.is_transactional(target) -%}
+        {{ return('merge') }}
+    {%- endif -%}
+    {{ return('overwrite') }}
+{%- endmacro %}
+
+
+{#-- Snapshots partitioned by dbt_is_current compare the source to the current partition only,
+     so staging doesn't read a history that keeps growing --#}
+{% macro odps__snapshot_staging_table(strategy, source_sql, target_relation) -%}
+    {%- set staging_sql = default__snapshot_staging_table(strategy, source_sql, target_relation) -%}
+    {%- if odps__snapshot_update_mode(target_relation) != 'current_partition' -%}
+        {{ return(staging_sql) }}
+    {%- endif -%}
+    {%- set pruned = modules.re.subn('where\\s+dbt_valid_to\\s+is\\s+null',
+                                     "where dbt_valid_to is null and dbt_is_current = 'true'",
+                                     staging_sql, flags=modules.re.IGNORECASE) -%}
+    {%- if pruned[1] != 1 -%}
+        {%- do log("Can't limit the snapshot staging query of " ~ target_relation ~ " to its current partition") -%}
+        {{ return(staging_sql) }}
+    {%- endif -%}
+    {{ return(pruned[0]) }}
+{%- endmacro %}
+
+
+{#-- Close the changed rows into the history partition, then rewrite the current partition --#}
+{% macro odps__snapshot_current_partition_sql(target, source, insert_cols) -%}
+    {%- set close_sql -%}
+    insert into table {{ target }} partition (dbt_is_current='false')
+    select
+        {% for column in insert_cols -%}
+            {%- if 'dbt_valid_to' in column -%}
+                DBT_INTERNAL_SOURCE.{{ column }}
+            {%- else -%}
+                DBT_INTERNAL_TARGET.{{ column }}
+            {%- endif -%}
+            {%- if not loop.last -%}, {%- endif -%}
+        {%- endfor %}
+    from {{ target }} as DBT_INTERNAL_TARGET
+    join {{ source }} as DBT_INTERNAL_SOURCE
+    on DBT_INTERNAL_TARGET.dbt_scd_id = DBT_INTERNAL_SOURCE.dbt_scd_id
+    where DBT_INTERNAL_TARGET.dbt_is_current = 'true'
+      and DBT_INTERNAL_SOURCE.dbt_change_type in ('update', 'delete')
+    {%- endset -%}
+
+    {%- set current_sql -%}
+    insert overwrite table {{ target }} partition (dbt_is_current='true')
+    select
+        {% for column in insert_cols -%}
+            DBT_INTERNAL_TARGET.{{ column }}
+            {%- if not loop.last -%}, {%- endif -%}
+        {%- endfor %}
+    from {{ target }} as DBT_INTERNAL_TARGET
+    left anti join {{ source }} as DBT_INTERNAL_SOURCE
+    on DBT_INTERNAL_TARGET.dbt_scd_id = DBT_INTERNAL_SOURCE.dbt_scd_id
+      and DBT_INTERNAL_SOURCE.dbt_change_type in ('update', 'delete')
+    where DBT_INTERNAL_TARGET.dbt_is_current = 'true'
+    union all
+    select
+        {% for column in insert_cols -%}
+            DBT_INTERNAL_SOURCE.{{ column }}
+            {%- if not loop.last -%}, {%- endif -%}
+        {%- endfor %}
+    from {{ source }} as DBT_INTERNAL_SOURCE
+    where DBT_INTERNAL_SOURCE.dbt_change_type = 'insert'
+    {%- endset -%}
+
+    {{ return([close_sql, current_sql]) }}
+{%- endmacro %}
+
+
 {% macro odps__snapshot_merge_sql(target, source, insert_cols) -%}
     {%- set insert_cols_csv = insert_cols | join(', ') -%}
 
+    {% if odps__snapshot_update_mode(target) == 'merge' %}
+    merge into {{ target }} as DBT_INTERNAL_DEST
+    using {{ source }} as DBT_INTERNAL_SOURCE
+    on DBT_INTERNAL_SOURCE.dbt_scd_id = DBT_INTERNAL_DEST.dbt_scd_id
+
+    when matched
+     and DBT_INTERNAL_DEST.dbt_valid_to is null
+     and DBT_INTERNAL_SOURCE.dbt_change_type in ('update', 'delete')
+        then update
+        set dbt_valid_to = DBT_INTERNAL_SOURCE.dbt_valid_to
+
+    when not matched
+     and DBT_INTERNAL_SOURCE.dbt_change_type = 'insert'
+        then insert ({{ insert_cols_csv }})
+        values (
+          {%- for column in insert_cols -%}
+            DBT_INTERNAL_SOURCE.{{ column }}
+            {%- if not loop.last %}, {%- endif %}
+          {%- endfor -%}
+        )
+    {% else %}
+
     insert overwrite table {{ target}} 
     select 
         {% for column in insert_cols -%}
@@ -56,24 +170,38 @@
       {%- endfor %}
     from {{ source }} as DBT_INTERNAL_SOURCE
     where DBT_INTERNAL_SOURCE.dbt_change_type = 'insert';
+    {% endif %}
 
 {% endmacro %}
 
 
 {% macro odps_build_snapshot_staging_table(strategy, sql, target_relation) %}
     {% set tmp_identifier = target_relation.identifier ~ '__dbt_tmp' %}
+    {#-- 'table' computes the staging data once, every later step reads the stored rows --#}
+    {% set staging_type = config.get('snapshot_staging', 'view') %}
+    {% if staging_type not in ('view', 'table') %}
+      {% do exceptions.raise_compiler_error("Invalid snapshot_staging: " ~ staging_type ~ ", expected one of: 'view', 'table'") %}
+    {% endif %}
 
     {%- set tmp_relation = api.Relation.create(identifier=tmp_identifier,
                                                   schema=target_relation.schema,
                                                   database=target_relation.database,
-                                                  type='view') -%}
+                                                  type=staging_type) -%}
 
     {% set select = snapshot_staging_table(strategy, sql, target_relation) %}
 
-    {# needs to be a non-temp view so that its columns can be ascertained via `describe` #}
-    {% call statement('build_snapshot_staging_relation') %}
-        {{ create_view_as(tmp_relation, select) }}
-    {% endcall %}
+    {% if staging_type == 'table' %}
+        {{ drop_relation_if_exists(adapter.get_relation(tmp_relation.database, tmp_relation.schema, tmp_identifier)) }}
+        {% call statement('build_snapshot_staging_relation') %}
+            create table {{ tmp_relation }} lifecycle 1 as
+            {{ select }}
+        {% endcall %}
+    {% else %}
+        {# needs to be a non-temp view so that its columns can be ascertained via `describe` #}
+        {% call statement('build_snapshot_staging_relation') %}
+            {{ create_view_as(tmp_relation, select) }}
+        {% endcall %}
+    {% endif %}
 
     {% do return(tmp_relation) %}
 {% endmacro %}
@@ -165,19 +293,27 @@
         {% do quoted_dest_columns.append(adapter.quote(column.name)) %}
       {% endfor %}
 
-      {% set final_sql = snapshot_merge_sql(
-            target = target_relation,
-            source = staging_table,
-            insert_cols = quoted_dest_columns,
-            
-         )
-      %}
+      {% if odps__snapshot_update_mode(target_relation) == 'current_partition' %}
+        {% set merge_statements = odps__snapshot_current_partition_sql(target_relation, staging_table, quoted_dest_columns) %}
+      {% else %}
+        {% set final_sql = snapshot_merge_sql(
+              target = target_relation,
+              source = staging_table,
+              insert_cols = quoted_dest_columns,
+           )
+        %}
+      {% endif %}
 
   {% endif %}
 
-  {% call statement('main') %}
-      {{ final_sql }}
-  {% endcall %}
+  {% if merge_statements is defined %}
+    {#-- both partitions change together, as one script --#}
+    {% do store_result('main', response=adapter.execute_script(merge_statements)) %}
+  {% else %}
+    {% call statement('main') %}
+        {{ final_sql }}
+    {% endcall %}
+  {% endif %}
 
   {% do persist_docs(target_relation, model) %}
 
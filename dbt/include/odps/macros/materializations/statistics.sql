@@ -0,0 +1,41 @@
+{#-- With `collect_statistics`, submit column statistics collection of the built table for the optimizer,
+     without waiting for it: `table` (or true) analyzes the whole table, `partitions` only the partitions
+     whose data changed after `written_after`, or the whole table when that's more than `statistics_max_partitions`
+     or everything was rewritten (`written_after` 0) --#}
+{% macro odps__collect_statistics(relation, written_after=none) %}
+  {%- set mode = config.get('collect_statistics') -%}
+  {%- if not mode -%}
+    {{ return(none) }}
+  {%- endif -%}
+  {%- if mode is sameas true -%}
+    {%- set mode = 'table' -%}
+  {%- endif -%}
+  {%- if mode not in ('table', 'partitions') -%}
+    {%- do exceptions.raise_compiler_error("Invalid collect_statistics: " ~ mode ~ ", expected one of: 'table', 'partitions'") -%}
+  {%- endif -%}
+
+  {%- set partitions = none -%}
+  {%- if mode == 'partitions' and written_after -%}
+    {%- set partitions = adapter.partitions_modified_after(relation, written_after) -%}
+    {%- if partitions is not none and partitions | length > config.get('statistics_max_partitions', 20) -%}
+      {%- set partitions = none -%}
+    {%- endif -%}
+  {%- endif -%}
+  {%- set columns = config.get('statistics_columns') -%}
+  {%- set column_list = ' (' ~ columns | join(', ') ~ ')' if columns else '' -%}
+
+  {%- set statements = [] -%}
+  {%- if partitions is none -%}
+    {%- do statements.append('analyze table ' ~ relation ~ ' compute statistics for columns' ~ column_list) -%}
+  {%- else -%}
+    {%- for spec in partitions -%}
+      {%- set predicates = [] -%}
+      {%- for key, value in spec.items() -%}
+        {%- do predicates.append(key ~ "='" ~ escape_single_quotes(value) ~ "'") -%}
+      {%- endfor -%}
+      {%- do statements.append('analyze table ' ~ relation ~ ' partition (' ~ predicates | join(', ') ~ ')'
+                               ~ ' compute statistics for columns' ~ column_list) -%}
+    {%- endfor -%}
+  {%- endif -%}
+  {%- do adapter.submit_statements(statements) -%}
+{% endmacro %}
@@ -2,6 +2,12 @@
 
   {%- set existing_relation = load_cached_relation(this) -%}
   {%- set target_relation = this.incorporate(type='table') %}
+
+  -- with skip_unchanged, a table built from the same sql and upstream data is left as is
+  {%- set fingerprint = odps__model_fingerprint() -%}
+  {%- if odps__is_unchanged(existing_relation, fingerprint) -%}
+    {{ return(odps__skip_unchanged(target_relation)) }}
+  {%- endif -%}
   {%- set intermediate_relation =  make_intermediate_relation(target_relation) -%}
   -- the intermediate_relation should not already exist in the database; get_relation
   -- will return None in that case. Otherwise, we get a relation that we can drop
@@ -17,6 +23,23 @@
   -- grab current tables grants config for comparision later on
   {% set grant_config = config.get('grants') %}
 
+  -- with on_rebuild 'overwrite', an existing table of the same schema is overwritten in place
+  {%- set on_rebuild = config.get('on_rebuild', 'swap') -%}
+  {%- if on_rebuild not in ('swap', 'overwrite') -%}
+    {%- do exceptions.raise_compiler_error("Invalid on_rebuild: " ~ on_rebuild ~ ", expected one of: 'swap', 'overwrite'") -%}
+  {%- endif -%}
+  {%- set overwrite_in_place = on_rebuild == 'overwrite'
+                               and existing_relation is not none and existing_relation.is_table
+                               and odps__table_schema_matches(existing_relation, sql) -%}
+  {%- if overwrite_in_place -%}
+    -- partitions the overwrite writes change after the last write before it, by the ODPS clock
+    {%- set written_after = adapter.get_data_modified_time(existing_relation) -%}
+    {%- if not written_after -%}
+      {%- do log("No data modification time of " ~ existing_relation ~ ", rebuilding by swap") -%}
+      {%- set overwrite_in_place = false -%}
+    {%- endif -%}
+  {%- endif %}
+
   -- drop the temp relations if they exist already in the database
   {{ drop_relation_if_exists(preexisting_intermediate_relation) }}
   {{ drop_relation_if_exists(preexisting_backup_relation) }}
@@ -26,31 +49,45 @@
   -- `BEGIN` happens here:
   {{ run_hooks(pre_hooks, inside_transaction=True) }}
 
-  -- build model
-  {% call statement('main') -%}
-    {{ get_create_table_as_sql(False, intermediate_relation, sql) }}
-  {%- endcall %}
+  -- with submit_mode 'script', DDL/DML below is submitted as one script instance
+  {% do adapter.begin_script(config.get('submit_mode')) %}
+
+  {% if overwrite_in_place %}
+    -- build model
+    {% call statement('main') -%}
+      {{ odps__insert_overwrite_table_sql(target_relation, sql) }}
+    {%- endcall %}
 
-  -- cleanup
-  {% if existing_relation is not none %}
-     /* Do the equivalent of rename_if_exists. 'existing_relation' could have been dropped
-        since the variable was first set. */
-    {% set existing_relation = load_cached_relation(existing_relation) %}
+    {#-- looking the partitions up submits the script so far, the insert has run --#}
+    {% do odps__drop_partitions(target_relation, adapter.stale_partitions(target_relation, written_after)) %}
+    {% do odps__apply_table_options(target_relation) %}
+  {% else %}
+    -- build model
+    {% call statement('main') -%}
+      {{ get_create_table_as_sql(False, intermediate_relation, sql) }}
+    {%- endcall %}
+
+    -- cleanup
     {% if existing_relation is not none %}
-        {% if existing_relation.can_be_renamed %}
-            {{ adapter.rename_relation(existing_relation, backup_relation) }}
-        {% else  %}
-            {{ drop_relation_if_exists(existing_relation) }}
-        {% endif %}
+       /* Do the equivalent of rename_if_exists. 'existing_relation' could have been dropped
+          since the variable was first set. */
+      {% set existing_relation = load_cached_relation(existing_relation) %}
+      {% if existing_relation is not none %}
+          {% if existing_relation.can_be_renamed %}
+              {{ adapter.rename_relation(existing_relation, backup_relation) }}
+          {% else  %}
+              {{ drop_relation_if_exists(existing_relation) }}
+          {% endif %}
+      {% endif %}
     {% endif %}
-  {% endif %}
 
 
-  {{ adapter.rename_relation(intermediate_relation, target_relation) }}
+    {{ adapter.rename_relation(intermediate_relation, target_relation) }}
+  {% endif %}
 
   {{ run_hooks(post_hooks, inside_transaction=True) }}
 
-  {% set should_revoke = should_revoke(existing_relation, full_refresh_mode=True) %}
+  {% set should_revoke = should_revoke(existing_relation, full_refresh_mode=not overwrite_in_place) %}
   {% do apply_grants(target_relation, grant_config, should_revoke=should_revoke) %}
 
   {% do persist_docs(target_relation, model) %}
@@ -59,9 +96,92 @@
   {{ adapter.commit() }}
 
   -- finally, drop the existing/backup relation after the commit
-  {{ drop_relation_if_exists(backup_relation) }}
+  {% if not overwrite_in_place %}
+    {{ drop_relation_if_exists(backup_relation) }}
+  {% endif %}
+
+  {% if fingerprint is not none %}
+    {% do odps__set_tbl_properties(target_relation, {'dbt.fingerprint': fingerprint}) %}
+  {% elif overwrite_in_place %}
+    {% do odps__clear_fingerprint(target_relation) %}
+  {% endif %}
+
+  {% do adapter.end_script() %}
+
+  {% do odps__collect_statistics(target_relation) %}
 
   {{ run_hooks(post_hooks, inside_transaction=False) }}
 
   {{ return({'relations': [target_relation]}) }}
 {% endmaterialization %}  
+
+
+{#-- Whether the model sql produces exactly the columns, partitions and clustering of the existing table --#}
+{% macro odps__table_schema_matches(relation, sql) %}
+  {%- set target_partitions = adapter.get_partition_columns_in_relation(relation) | map(attribute='name') | map('lower') | list -%}
+  {%- if target_partitions != partition_field_names() | map('lower') | list -%}
+    {{ return(false) }}
+  {%- endif -%}
+  {%- if config.get('lifecycle') is none and adapter.get_table_lifecycle(relation) is not none -%}
+    {%- do log("Lifecycle of " ~ relation ~ " was removed, rebuilding by swap") -%}
+    {{ return(false) }}
+  {%- endif -%}
+  {%- if not adapter.cluster_layout_matches(relation, odps__cluster_layout()) -%}
+    {%- do log("Clustering of " ~ relation ~ " changed, rebuilding by swap") -%}
+    {{ return(false) }}
+  {%- endif -%}
+  {%- set source_columns = odps__get_columns_from_query(sql) -%}
+  {%- set target_columns = adapter.get_columns_in_relation(relation) -%}
+  {%- if source_columns | length != target_columns | length -%}
+    {{ return(false) }}
+  {%- endif -%}
+  {%- for source_column in source_columns -%}
+    {%- set target_column = target_columns[loop.index0] -%}
+    {%- if source_column.name | lower != target_column.name | lower
+           or source_column.dtype | lower != target_column.dtype | lower -%}
+      {%- do log("Schema of " ~ relation ~ " changed at column " ~ target_column.name ~ ", rebuilding by swap") -%}
+      {{ return(false) }}
+    {%- endif -%}
+  {%- endfor -%}
+  {{ return(true) }}
+{% endmacro %}
+
+
+{% macro odps__insert_overwrite_table_sql(relation, sql) %}
+  {%- set sql_header = config.get('sql_header', none) -%}
+  {%- set contract_config = config.get('contract') -%}
+  {%- if contract_config.enforced -%}
+    {{ get_assert_columns_equivalent(sql) }}
+    {%- set sql = get_select_subquery(sql) -%}
+  {%- endif -%}
+  {{ sql_header if sql_header is not none }}
+  insert overwrite table {{ relation }}
+  {{ partition_cols(label="partition") }}
+  {{ sql }}
+{% endmacro %}
+
+
+{#-- A full rebuild replaces every partition, drop those it didn't write --#}
+{% macro odps__drop_partitions(relation, partitions) %}
+  {%- if partitions -%}
+    {% call statement('drop_stale_partitions') -%}
+      alter table {{ relation }} drop if exists
+      {%- for spec in partitions %} partition ({{ spec }}){{ "," if not loop.last }}{% endfor %}
+    {%- endcall %}
+  {%- endif -%}
+{% endmacro %}
+
+
+{#-- Lifecycle and table properties of the model config, as a swap would have created them --#}
+{% macro odps__apply_table_options(relation) %}
+  {%- set lifecycle = config.get('lifecycle') -%}
+  {%- if lifecycle is not none -%}
+    {% call statement('set_lifecycle') -%}
+      alter table {{ relation }} set lifecycle {{ lifecycle }}
+    {%- endcall %}
+  {%- endif -%}
+  {%- set properties = config.get('tbl_properties') -%}
+  {%- if properties -%}
+    {% do odps__set_tbl_properties(relation, properties) %}
+  {%- endif -%}
+{% endmacro %}
@@ -0,0 +1,124 @@
+{%- materialization test, adapter='odps' -%}
+
+  {% set relations = [] %}
+
+  {% if should_store_failures() %}
+
+    {% set identifier = model['alias'] %}
+    {% set old_relation = adapter.get_relation(database=database, schema=schema, identifier=identifier) %}
+
+    {% set store_failures_as = config.get('store_failures_as') %}
+    {% if store_failures_as == none %}{% set store_failures_as = 'table' %}{% endif %}
+    {% if store_failures_as not in ['table', 'view'] %}
+        {{ exceptions.raise_compiler_error(
+            "'" ~ store_failures_as ~ "' is not a valid value for `store_failures_as`. "
+            "Accepted values are: ['ephemeral', 'table', 'view']"
+        ) }}
+    {% endif %}
+
+    {% set target_relation = api.Relation.create(
+        identifier=identifier, schema=schema, database=database, type=store_failures_as) -%}
+
+    {% if old_relation %}
+        {% do adapter.drop_relation(old_relation) %}
+    {% endif %}
+
+    {% call statement(auto_begin=True) %}
+        {{ get_create_sql(target_relation, sql) }}
+    {% endcall %}
+
+    {% do relations.append(target_relation) %}
+
+    {% set main_sql %}
+        select *
+        from {{ target_relation }}
+    {% endset %}
+
+    {{ adapter.commit() }}
+
+  {% else %}
+
+      {% set main_sql = sql %}
+
+  {% endif %}
+
+  {% set limit = config.get('limit') %}
+  {% set fail_calc = config.get('fail_calc') %}
+  {% set warn_if = config.get('warn_if') %}
+  {% set error_if = config.get('error_if') %}
+
+  {% if not should_store_failures() and adapter.test_batching_enabled(config.get('batch_tests')) %}
+    {#-- tests on the same model running at the same time share one query --#}
+    {% set batch_key = model.attached_node or (model.depends_on.nodes | first) %}
+    {% set response, table = adapter.run_batched_test(batch_key, get_test_sql(main_sql, fail_calc, warn_if, error_if, limit)) %}
+    {% do store_result('main', response=response, agate_table=table) %}
+  {% else %}
+    {% call statement('main', fetch_result=True) -%}
+
+      {{ get_test_sql(main_sql, fail_calc, warn_if, error_if, limit)}}
+
+    {%- endcall %}
+  {% endif %}
+
+  {{ return({'relations': relations}) }}
+
+{%- endmaterialization -%}
+
+
+{% macro odps__get_where_subquery(relation) -%}
+    {%- set conditions = [] -%}
+    {%- set where = config.get('where', '') -%}
+    {%- if where -%}
+        {%- do conditions.append('(' ~ where ~ ')') -%}
+    {%- endif -%}
+    {%- set partition_filter = odps__test_partition_filter(relation) -%}
+    {%- if partition_filter is not none -%}
+        {%- do conditions.append(partition_filter) -%}
+    {%- endif -%}
+    {% if conditions %}
+        {%- set filtered -%}
+            (select * from {{ relation }} where {{ conditions | join(' and ') }}) dbt_subquery
+        {%- endset -%}
+        {% do return(filtered) %}
+    {%- else -%}
+        {% do return(relation) %}
+    {%- endif -%}
+{%- endmacro %}
+
+
+{#-- Restrict a test to the latest N partitions (`test_partitions: N`) or to the partitions written
+     by the last build (`test_partitions: written`), set on the test or on the tested model --#}
+{% macro odps__test_partition_filter(relation) -%}
+    {%- set setting = config.get('test_partitions') -%}
+    {%- if setting is none and model.attached_node -%}
+        {%- set attached = graph.nodes.get(model.attached_node) -%}
+        {%- set setting = attached.config.get('test_partitions') if attached else none -%}
+    {%- endif -%}
+    {%- if setting is none or not execute -%}
+        {{ return(none) }}
+    {%- endif -%}
+
+    {%- if setting == 'written' -%}
+        {%- set written_after = odps__get_tbl_property(relation, 'dbt.written_after') -%}
+        {%- if written_after is none -%}
+            {%- do log("No partitions recorded for " ~ relation ~ ", testing the whole table") -%}
+            {{ return(none) }}
+        {%- endif -%}
+        {%- set partitions = adapter.partitions_modified_after(relation, written_after | float) -%}
+    {%- else -%}
+        {%- set partitions = adapter.latest_partitions(relation, setting | int) -%}
+    {%- endif -%}
+    {%- if partitions is none -%}
+        {{ return(none) }}
+    {%- endif -%}
+
+    {%- set matches = [] -%}
+    {%- for partition in partitions -%}
+        {%- set fields = [] -%}
+        {%- for key, value in partition.items() -%}
+            {%- do fields.append(key ~ " = '" ~ escape_single_quotes(value) ~ "'") -%}
+        {%- endfor -%}
+        {%- do matches.append('(' ~ fields | join(' and ') ~ ')') -%}
+    {%- endfor -%}
+    {{ return('(' ~ (matches | join(' or ') if matches else 'false') ~ ')') }}
+{%- endmacro %}
@@ -15,5 +15,22 @@
 #}
 
 {% materialization view, adapter='odps' -%}
-    {{ return(create_or_replace_view()) }}
+  {%- set existing_relation = load_cached_relation(this) -%}
+  {%- set target_relation = this.incorporate(type='view') -%}
+
+  {#-- an existing view of the same definition is left as is, saving the DDL instance --#}
+  {%- if existing_relation is not none and existing_relation.is_view and not should_full_refresh()
+         and adapter.view_definition_matches(existing_relation, sql) -%}
+    {% set grant_config = config.get('grants') %}
+    {{ run_hooks(pre_hooks) }}
+    {% do store_result('main', response=adapter.unchanged_response()) %}
+    {#-- the view keeps its grants, apply_grants only issues the difference to the configured ones --#}
+    {% if grant_config %}
+      {% do apply_grants(target_relation, grant_config, should_revoke=True) %}
+    {% endif %}
+    {{ run_hooks(post_hooks) }}
+    {{ return({'relations': [target_relation]}) }}
+  {%- endif -%}
+
+  {{ return(create_or_replace_view()) }}
 {%- endmaterialization %}
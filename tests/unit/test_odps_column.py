@@ -0,0 +1,27 @@
+from dbt.adapters.odps.colums import OdpsColumn, is_widening
+
+
+def test_is_widening_numbers():
+    assert is_widening("int", "bigint")
+    assert is_widening("tinyint", "int")
+    assert is_widening("float", "double")
+    assert is_widening("bigint", "bigint")
+    assert not is_widening("bigint", "int")
+    assert not is_widening("double", "bigint")
+    assert not is_widening("bigint", "string")
+
+
+def test_is_widening_decimal_and_strings():
+    assert is_widening("decimal(10,2)", "decimal(12,2)")
+    assert is_widening("decimal(10,2)", "decimal(12,4)")
+    assert not is_widening("decimal(10,2)", "decimal(11,4)")
+    assert is_widening("varchar(10)", "varchar(20)")
+    assert is_widening("VARCHAR(10)", "string")
+    assert not is_widening("varchar(20)", "varchar(10)")
+    assert not is_widening("string", "varchar(10)")
+
+
+def test_column_can_widen_to():
+    column = OdpsColumn(column="id", dtype="int")
+    assert column.can_widen_to("bigint")
+    assert not column.can_widen_to("smallint")
@@ -0,0 +1,21 @@
+import pytest
+
+from dbt.adapters.odps.date import batch_ranges
+
+
+def _formatted(ranges):
+    return [(start.format(), end.format()) for start, end in ranges]
+
+
+def test_batch_ranges():
+    assert _formatted(batch_ranges('2024-01-30', '20240202', 'day')) == [
+        ('20240130', '20240131'), ('20240131', '20240201'), ('20240201', '20240202')
+    ]
+    assert _formatted(batch_ranges('2024-01-03', '20240115', 'week')) == [
+        ('20240103', '20240108'), ('20240108', '20240115')
+    ]
+    assert _formatted(batch_ranges('2024-01-30', '20240305', 'month')) == [
+        ('20240130', '20240201'), ('20240201', '20240301'), ('20240301', '20240305')
+    ]
+    with pytest.raises(ValueError):
+        batch_ranges('2024-01-01', '2024-02-01', 'hour')
@@ -0,0 +1,156 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+from odps.errors import InternalServerError, NoSuchObject
+
+from dbt.adapters.odps import dbapi
+from dbt.adapters.odps.dbapi import ODPSCursor, QueryOptions, TableSizes
+from dbt.adapters.odps.errors import QueryTimeoutError
+from dbt.adapters.odps.registry import RUNNING_INSTANCES
+from dbt.adapters.odps.retry import RetryPolicy
+from dbt.adapters.odps.throttle import AdaptiveThrottle
+
+
+class FakeReader(object):
+    def __init__(self, count):
+        self.count = count
+
+    def read(self, start=0, count=None):
+        return [SimpleNamespace(values=[i]) for i in range(start, start + count)]
+
+
+def make_cursor(count, threads):
+    cursor = ODPSCursor.__new__(ODPSCursor)
+    cursor._instance = object()
+    cursor._download_session = FakeReader(count)
+    cursor._connection = SimpleNamespace(download_threads=threads)
+    return cursor
+
+
+def test_iter_rows_limit():
+    assert list(make_cursor(10, 1).iter_rows(3)) == [[0], [1], [2]]
+    assert len(list(make_cursor(10, 1).iter_rows())) == 10
+    assert list(make_cursor(10, 1).iter_rows(0)) == []
+
+
+def test_iter_rows_parallel_blocks_keep_order(monkeypatch):
+    monkeypatch.setattr(dbapi, "DOWNLOAD_BLOCK_ROWS", 3)
+    rows = list(make_cursor(10, 4).iter_rows())
+    assert rows == [[i] for i in range(10)]
+    assert list(make_cursor(10, 2).iter_rows(7)) == [[i] for i in range(7)]
+
+
+class FakeTables(object):
+    def __init__(self, sizes, views=()):
+        self.sizes = sizes
+        self.views = views
+        self.lookups = []
+
+    def get_table(self, name):
+        self.lookups.append(name)
+        if name not in self.sizes and name not in self.views:
+            raise NoSuchObject(name)
+        return SimpleNamespace(
+            reload=lambda: None, is_virtual_view=name in self.views, size=self.sizes.get(name, 0)
+        )
+
+
+def routing_cursor(mode, model_setting=None, input_size=0):
+    cursor = ODPSCursor.__new__(ODPSCursor)
+    cursor._connection = SimpleNamespace(
+        options=QueryOptions(interactive=model_setting),
+        interactive=mode,
+        interactive_max_input_bytes=100,
+        odps=FakeTables({"t": input_size}),
+        table_sizes=TableSizes(),
+    )
+    return cursor
+
+
+def test_route_interactive():
+    assert routing_cursor("queries")._route_interactive("select 1")
+    assert not routing_cursor("queries")._route_interactive("insert into t select 1")
+    assert not routing_cursor("off")._route_interactive("select 1")
+    assert routing_cursor("off", model_setting=True)._route_interactive("select 1")
+    assert not routing_cursor("queries", model_setting=False)._route_interactive("select 1")
+    assert routing_cursor("auto", input_size=50)._route_interactive("select * from t")
+    assert not routing_cursor("auto", input_size=500)._route_interactive("select * from t")
+
+
+def test_table_sizes():
+    odps = FakeTables({"p.a": 10, "b": 20}, views=("v",))
+    sizes = TableSizes()
+    sql = "with c as (select * from p.a) select * from c join `b` on c.id = b.id"
+    assert sizes.input_size(odps, sql) == 30
+    assert sizes.input_size(odps, sql) == 30
+    assert sorted(odps.lookups) == ["b", "c", "p.a"]
+    assert sizes.input_size(odps, "select * from v") is None
+
+
+class RunningInstance(object):
+    id = "20240101000000000g"
+
+    def __init__(self):
+        self.stopped = False
+
+    def is_terminated(self):
+        return self.stopped
+
+    def get_task_statuses(self):
+        return {}
+
+    def stop(self):
+        self.stopped = True
+
+
+def test_wait_for_instance_timeout(monkeypatch):
+    monkeypatch.setattr(dbapi, "POLL_INTERVAL", 0.01)
+    instance = RunningInstance()
+    with pytest.raises(QueryTimeoutError) as e:
+        ODPSCursor._wait_for_instance(instance, timeout=0.05)
+    assert instance.stopped
+    assert "query_timeout of 0.05s" in str(e.value)
+
+
+def test_submit_holds_throttle_slot(monkeypatch):
+    monkeypatch.setattr(dbapi, "POLL_INTERVAL", 0.01)
+    instance = RunningInstance()
+    instance.wait_for_success = lambda: None
+    throttle = AdaptiveThrottle(2)
+    cursor = ODPSCursor.__new__(ODPSCursor)
+    cursor._hints, cursor._priority = None, None
+    cursor._connection = SimpleNamespace(
+        options=QueryOptions(), throttle=throttle, odps=SimpleNamespace(run_sql=lambda sql, **kw: instance)
+    )
+
+    assert cursor.submit("analyze table t compute statistics for columns") is instance
+    assert throttle.in_flight == 1
+    assert RUNNING_INSTANCES.background(cursor._connection) == [instance.id]
+    instance.stopped = True
+    for _ in range(100):
+        if throttle.in_flight == 0:
+            break
+        time.sleep(0.01)
+    assert throttle.in_flight == 0
+    assert RUNNING_INSTANCES.running(cursor._connection) == []
+
+
+def test_retry_stops_the_failed_attempt(monkeypatch):
+    monkeypatch.setattr(dbapi.time, "sleep", lambda seconds: None)
+    first = RunningInstance()
+    cursor = ODPSCursor.__new__(ODPSCursor)
+    cursor._connection = SimpleNamespace(retry_policy=RetryPolicy(retries=2))
+    attempts = []
+
+    def run(sql, hints):
+        attempts.append(sql)
+        if len(attempts) == 1:
+            cursor._instance = first
+            raise InternalServerError("500 while polling")
+
+    cursor._run = run
+    cursor._reset_state = lambda: setattr(cursor, "_instance", None)
+    cursor._run_with_retries("insert overwrite table t select 1", {})
+    assert len(attempts) == 2
+    assert first.stopped
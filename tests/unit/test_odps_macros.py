@@ -0,0 +1,202 @@
+import os
+import re
+from types import SimpleNamespace
+
+import jinja2
+import pytest
+from dbt.exceptions import MacroReturn
+
+import dbt.include.global_project
+import dbt.include.odps
+
+ODPS_MACROS = os.path.join(os.path.dirname(dbt.include.odps.__file__), "macros")
+GLOBAL_MACROS = os.path.join(os.path.dirname(dbt.include.global_project.__file__), "macros")
+
+
+def macro_source(path, name):
+    source = open(path).read()
+    start = re.search(r"{%-?\s*macro\s+" + re.escape(name) + r"\b", source).start()
+    end = source.index("}", source.index("endmacro", start)) + 1
+    # renamed, so calls between macros go through the wrappers below and their `return` is caught
+    return source[start:end].replace("macro " + name, "macro m_" + name, 1)
+
+
+class Config(dict):
+    def get(self, key, default=None, validator=None):
+        return dict.get(self, key, default)
+
+
+class CompilerError(Exception):
+    pass
+
+
+def raise_compiler_error(message):
+    raise CompilerError(message)
+
+
+def render_macros(macros, config, aliases=None, **context):
+    """
+    Callables of the given (path, name) macros, rendered with plain jinja and a stub model config.
+    `aliases` dispatches names the macros call to one of them, as `adapter.dispatch` would.
+    Warnings the macros emit are collected in the returned `warnings`.
+    """
+    warnings = []
+    context = {
+        **context,
+        "config": Config(config),
+        "validation": SimpleNamespace(any={(list, str): None}),
+        "exceptions": SimpleNamespace(raise_compiler_error=raise_compiler_error, warn=warnings.append),
+        "warnings": warnings,
+        "basestring": str,
+    }
+
+    def do_return(value):
+        raise MacroReturn(value)
+
+    context["return"] = do_return
+    module = {}
+
+    def wrap(name):
+        def call(*args, **kwargs):
+            try:
+                return getattr(module["macros"], "m_" + name)(*args, **kwargs)
+            except MacroReturn as e:
+                return e.value
+        return call
+
+    for _, name in macros:
+        context[name] = wrap(name)
+    for alias, name in (aliases or {}).items():
+        context[alias] = wrap(name)
+    env = jinja2.Environment(extensions=["jinja2.ext.do"])
+    template = env.from_string("\n".join(macro_source(path, name) for path, name in macros), globals=context)
+    module["macros"] = template.make_module(context)
+    return context
+
+
+def column(name):
+    return SimpleNamespace(name=name, column=name, quoted=f"`{name}`")
+
+
+MERGE_MACROS = [
+    (os.path.join(ODPS_MACROS, "adapters.sql"), "partition_field_names"),
+    (os.path.join(ODPS_MACROS, "materializations", "incremental", "strategies.sql"), "get_qualified_columnnames_csv"),
+    (os.path.join(ODPS_MACROS, "materializations", "incremental", "strategies.sql"), "odps__get_merge_sql"),
+    (
+        os.path.join(GLOBAL_MACROS, "materializations", "models", "incremental", "column_helpers.sql"),
+        "default__get_merge_update_columns",
+    ),
+]
+
+
+def render_merge(config):
+    macros = render_macros(
+        MERGE_MACROS, config, aliases={"get_merge_update_columns": "default__get_merge_update_columns"}
+    )
+    sql = macros["odps__get_merge_sql"]("t", "s", "id", [column("id"), column("v"), column("ds")])
+    return " ".join(str(sql).split())
+
+
+def test_merge_does_not_update_partition_columns():
+    sql = render_merge({"partition_by": [{"field": "DS", "data_type": "string"}]})
+    assert "update set `id` = DBT_INTERNAL_SOURCE.`id`,`v` = DBT_INTERNAL_SOURCE.`v` when not matched" in sql
+    assert "insert (id, v, ds)" in sql
+
+
+def test_merge_updates_every_column_without_partitions():
+    assert "`ds` = DBT_INTERNAL_SOURCE.`ds`" in render_merge({})
+
+
+SNAPSHOT_MACROS = [
+    (os.path.join(ODPS_MACROS, "materializations", "snapshot.sql"), "odps__snapshot_update_mode"),
+    (os.path.join(ODPS_MACROS, "materializations", "snapshot.sql"), "odps__snapshot_staging_table"),
+    (
+        os.path.join(GLOBAL_MACROS, "materializations", "snapshots", "helpers.sql"),
+        "default__snapshot_staging_table",
+    ),
+]
+
+
+def render_snapshot_staging(partitions):
+    adapter = SimpleNamespace(
+        get_partition_columns_in_relation=lambda relation: [SimpleNamespace(name=name) for name in partitions],
+        is_transactional=lambda relation: False,
+    )
+    macros = render_macros(
+        SNAPSHOT_MACROS, {}, adapter=adapter, modules=SimpleNamespace(re=re), log=lambda message: "",
+        snapshot_get_time=lambda: "current_timestamp()",
+    )
+    strategy = SimpleNamespace(
+        unique_key="id", updated_at="updated_at", scd_id="md5(id)", invalidate_hard_deletes=False,
+        hard_deletes="ignore",
+    )
+    sql = macros["odps__snapshot_staging_table"](strategy, "select * from src", "snap")
+    return " ".join(str(sql).split())
+
+
+def test_snapshot_staging_reads_current_partition():
+    assert "from snap where dbt_valid_to is null and dbt_is_current = 'true'" in render_snapshot_staging(
+        ["dbt_is_current"]
+    )
+    assert "dbt_is_current" not in render_snapshot_staging([])
+
+
+STRATEGIES = os.path.join(ODPS_MACROS, "materializations", "incremental", "strategies.sql")
+OVERWRITE_MACROS = [
+    (os.path.join(ODPS_MACROS, "adapters.sql"), "partition_field_names"),
+    (STRATEGIES, "get_qualified_columnnames_csv"),
+    (STRATEGIES, "odps__insert_overwrite_partitions"),
+]
+
+
+def render_overwrite(partitions):
+    adapter = SimpleNamespace(
+        get_columns_in_relation=lambda relation: [column("v")],
+        execute_concurrently=lambda statements, concurrency, touched: [" ".join(sql.split()) for sql in statements],
+    )
+    macros = render_macros(
+        OVERWRITE_MACROS,
+        {"partition_by": [{"field": "ds", "data_type": "string"}, {"field": "hh", "data_type": "string"}]},
+        adapter=adapter,
+        log=lambda message: "",
+        escape_single_quotes=lambda value: str(value).replace("'", "\\'"),
+        odps__get_columns_from_query=lambda sql: [column("v")],
+        odps__assert_columns_equals=lambda source, dest: None,
+    )
+    return macros["odps__insert_overwrite_partitions"]("t", "select 1", partitions)
+
+
+def test_overwrite_partitions_follow_partition_by():
+    assert "partition (ds='20240101', hh) select" in render_overwrite([{"DS": "20240101"}])[0]
+    assert "partition (ds='20240101', hh='01') select" in render_overwrite([{"hh": "01", "ds": "20240101"}])[0]
+
+
+def test_overwrite_partitions_reject_invalid_specs():
+    with pytest.raises(CompilerError, match="not ds before it"):
+        render_overwrite([{"hh": "01"}])
+    with pytest.raises(CompilerError, match="Unknown partition column dt"):
+        render_overwrite([{"dt": "20240101"}])
+
+
+CLUSTER_MACROS = [
+    (os.path.join(ODPS_MACROS, "adapters.sql"), "partition_field_names"),
+    (os.path.join(ODPS_MACROS, "adapters.sql"), "odps__cluster_layout"),
+    (os.path.join(ODPS_MACROS, "adapters.sql"), "clustered_cols"),
+]
+
+
+def render_clustered_cols(config):
+    macros = render_macros(CLUSTER_MACROS, config, model=SimpleNamespace(unique_id="model.pkg.m"))
+    return " ".join(str(macros["clustered_cols"]("clustered by")).split()), macros["warnings"]
+
+
+def test_clustered_cols():
+    assert render_clustered_cols({"clustered_by": ["a", "b"], "buckets": 8}) == (
+        "clustered by (a, b) into 8 buckets", []
+    )
+
+
+def test_hash_clustering_without_buckets_is_ignored():
+    sql, warnings = render_clustered_cols({"clustered_by": "a"})
+    assert sql == ""
+    assert warnings == ["Hash clustering by a requires `buckets`, model.pkg.m is built unclustered"]
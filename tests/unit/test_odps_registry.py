@@ -0,0 +1,54 @@
+from dbt.adapters.odps.registry import InstanceRegistry
+
+
+class FakeInstance(object):
+    def __init__(self, id, fail=False):
+        self.id = id
+        self.fail = fail
+        self.stopped = False
+        self.terminated = False
+
+    def is_terminated(self):
+        return self.terminated
+
+    def stop(self):
+        if self.fail:
+            raise RuntimeError("stop failed")
+        self.stopped = True
+
+
+def test_stop_all_by_owner():
+    registry = InstanceRegistry()
+    a, b = object(), object()
+    first, second, third = FakeInstance("i1"), FakeInstance("i2"), FakeInstance("i3")
+    registry.add(a, first)
+    registry.add(a, second)
+    registry.add(b, third)
+    registry.discard(a, second)
+
+    assert registry.stop_all(a) == (["i1"], [])
+    assert first.stopped and not second.stopped and not third.stopped
+    assert registry.stop_all(object()) == ([], [])
+
+
+def test_stop_all_process():
+    registry = InstanceRegistry()
+    registry.add(object(), FakeInstance("i1"))
+    registry.add(object(), FakeInstance("i2", fail=True))
+    stopped, failed = registry.stop_all()
+    assert stopped == ["i1"]
+    assert failed == ["i2"]
+
+
+def test_stop_all_background():
+    registry = InstanceRegistry()
+    owner = object()
+    finished, running = FakeInstance("i1"), FakeInstance("i2")
+    finished.terminated = True
+    registry.add(owner, finished, background=True)
+    registry.add(owner, running, background=True)
+    assert registry.background(owner) == ["i1", "i2"]
+
+    assert registry.stop_all(owner) == (["i2"], [])
+    assert not finished.stopped and running.stopped
+    assert registry.running() == []
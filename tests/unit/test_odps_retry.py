@@ -0,0 +1,36 @@
+from odps.errors import ODPSError, InternalServerError
+
+from dbt.adapters.odps.retry import RetryPolicy
+from dbt.adapters.odps.utils import is_idempotent
+
+
+def test_retryable_errors():
+    policy = RetryPolicy(retries=3)
+    assert policy.is_retryable(InternalServerError("500"))
+    assert policy.is_retryable(ODPSError("ODPS-0123144: Fuxi job failed", code="ODPS-0123144"))
+    assert policy.is_retryable(ODPSError("Instance failed: ODPS-0010000:System internal error"))
+    assert not policy.is_retryable(ODPSError("ODPS-0130071:[1,8] Semantic analysis exception", code="ODPS-0130071"))
+    assert not RetryPolicy(retries=3, errors=["ODPS-0130071"]).is_retryable(InternalServerError("500"))
+
+
+def test_backoff():
+    policy = RetryPolicy(retries=3, backoff=5, max_elapsed=60)
+    error = InternalServerError("500")
+    assert [policy.next_delay(error, attempt, 0) for attempt in range(4)] == [5, 10, 20, None]
+    assert policy.next_delay(error, 2, 50) is None
+    assert policy.next_delay(ValueError("bad"), 0, 0) is None
+
+
+def test_is_idempotent():
+    assert is_idempotent("select 1")
+    assert is_idempotent("insert overwrite table t partition (ds) select 1, '20240101'")
+    assert is_idempotent("drop table if exists t")
+    assert is_idempotent("CREATE TABLE IF NOT EXISTS t (a int)")
+    assert is_idempotent("create or replace view v as select 1")
+    assert is_idempotent("alter table t drop if exists partition (ds='20240101')")
+    assert not is_idempotent("insert into t select 1")
+    assert not is_idempotent("create table t as select 1")
+    assert not is_idempotent("merge into t using s on t.id = s.id when matched then delete")
+    assert is_idempotent("with a as (select 1) select * from a")
+    assert is_idempotent("with a as (select ')' as x) insert overwrite table t select * from a")
+    assert not is_idempotent("with a as (select 1), b (x) as (select (2)) insert into t select * from a, b")
@@ -0,0 +1,27 @@
+from dbt.adapters.odps.scheduling import critical_path_priorities, critical_path_scores
+
+
+CHILD_MAP = {
+    "model.p.a": ["model.p.b", "model.p.c", "test.p.not_null_a"],
+    "model.p.b": ["model.p.d"],
+    "model.p.c": [],
+    "model.p.d": [],
+    "test.p.not_null_a": [],
+}
+
+
+def test_critical_path_scores():
+    scores = critical_path_scores(CHILD_MAP)
+    assert scores == {
+        "model.p.a": (3, 3),
+        "model.p.b": (2, 1),
+        "model.p.c": (1, 0),
+        "model.p.d": (1, 0),
+    }
+
+
+def test_critical_path_priorities():
+    priorities = critical_path_priorities(CHILD_MAP, lowest=9, highest=1)
+    assert priorities["model.p.a"] == 1
+    assert priorities["model.p.b"] == 5
+    assert priorities["model.p.c"] == priorities["model.p.d"] == 9
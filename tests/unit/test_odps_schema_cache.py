@@ -0,0 +1,36 @@
+import os
+import time
+
+from dbt.adapters.odps.colums import OdpsColumn
+from dbt.adapters.odps.schema_cache import SchemaCache
+
+
+def test_schema_cache_in_run():
+    cache = SchemaCache()
+    assert cache.get("select 1 as id") is None
+    columns = [OdpsColumn(column="id", dtype="int")]
+    cache.put("select 1 as id", columns)
+    assert cache.get(" select 1 as id\n") == columns
+    assert cache.get("select 2 as id") is None
+
+
+def test_schema_cache_across_runs(tmp_path):
+    columns = [OdpsColumn(column="id", dtype="bigint")]
+    # created on first write
+    tmp_path = tmp_path / "odps_schema_cache"
+    SchemaCache(tmp_path).put("select * from a", columns, version="a=1")
+
+    assert SchemaCache(tmp_path).get("select * from a", version="a=1") == columns
+    # a new version of the upstream, or an unknown one, misses
+    assert SchemaCache(tmp_path).get("select * from a", version="a=2") is None
+    assert SchemaCache(tmp_path).get("select * from a") is None
+    # expired entries are ignored
+    path = next(tmp_path.iterdir())
+    past = time.time() - 7200
+    os.utime(path, (past, past))
+    assert SchemaCache(tmp_path).get("select * from a", version="a=1") is None
+
+
+def test_schema_cache_unversioned_stays_in_run(tmp_path):
+    SchemaCache(tmp_path).put("select 1 as id", [OdpsColumn(column="id", dtype="int")])
+    assert list(tmp_path.iterdir()) == []
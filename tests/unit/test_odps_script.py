@@ -0,0 +1,28 @@
+import pytest
+
+from dbt.adapters.odps.script import SqlScript
+
+
+def test_script_render_and_locate():
+    script = SqlScript()
+    script.add("create table a (id bigint);")
+    script.add("insert into a\nselect 1")
+    script.add("  ")
+    assert len(script) == 2
+    assert script.render() == "create table a (id bigint);\ninsert into a\nselect 1;"
+    assert script.locate("ODPS-0130071:[3,8] Semantic analysis exception") == "insert into a\nselect 1"
+    assert script.locate("ODPS-0130071:[1,1] Semantic analysis exception") == "create table a (id bigint)"
+    assert script.locate("ODPS-0010000:System internal error") is None
+
+
+def test_script_hints_per_statement():
+    script = SqlScript()
+    script.add("insert overwrite table a select * from b", {"odps.sql.allow.fullscan": "true"})
+    assert script.accepts({"odps.sql.allow.fullscan": "true"})
+    assert not script.accepts()
+    with pytest.raises(ValueError):
+        script.add("insert overwrite table c select 1")
+    script.clear()
+    assert script.accepts()
+    script.add("insert overwrite table c select 1")
+    assert script.hints == {}
@@ -0,0 +1,40 @@
+import threading
+
+import pytest
+
+from dbt.adapters.odps.test_batch import TestBatcher
+
+
+def test_batcher_groups_concurrent_tests():
+    batcher = TestBatcher(window=0.5, max_size=3)
+    executed = []
+    results = {}
+
+    def execute(sqls):
+        executed.append(sqls)
+        return [sql.upper() for sql in sqls]
+
+    def run(sql):
+        results[sql] = batcher.run("model.a", sql, execute)
+
+    threads = [threading.Thread(target=run, args=(f"test_{i}",)) for i in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # a full group runs without waiting for the window
+    assert len(executed) == 1
+    assert sorted(executed[0]) == ["test_0", "test_1", "test_2"]
+    assert results == {f"test_{i}": f"TEST_{i}" for i in range(3)}
+
+
+def test_batcher_alone_and_errors():
+    batcher = TestBatcher(window=0.01)
+    assert batcher.run("model.a", "x", lambda sqls: [len(sqls)]) == 1
+
+    def fail(sqls):
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        batcher.run("model.a", "x", fail)
@@ -0,0 +1,15 @@
+from dbt.adapters.odps.throttle import AdaptiveThrottle
+
+
+def test_throttle_backs_off_and_ramps_up():
+    throttle = AdaptiveThrottle(8, queue_wait_threshold=30)
+    with throttle.slot() as report:
+        report["queue_seconds"] = 60
+    assert throttle.limit == 4
+    with throttle.slot() as report:
+        report["queue_seconds"] = 10
+    assert throttle.limit == 4
+    with throttle.slot() as report:
+        report["queue_seconds"] = 1
+    assert throttle.limit == 5
+    assert throttle.in_flight == 0
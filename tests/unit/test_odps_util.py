@@ -1,4 +1,6 @@
-from dbt.adapters.odps.utils import parse_hints
+from datetime import datetime
+
+from dbt.adapters.odps.utils import parse_hints, format_hints, fingerprint, normalize_sql, is_select, is_query, main_statement, cluster_layout_matches
 import  pytest
 
 
@@ -9,4 +11,63 @@ def test_parse_hints():
     '''
     hints, sql = parse_hints(input_string)
     assert hints == {'odps.sql.type.system.odps2': True}
-    assert sql.strip() == "select * from dual;"
\ No newline at end of file
+    assert sql.strip() == "select * from dual;"
+
+def test_parse_hints_odps_literals():
+    input_string = '''
+    SET odps.sql.allow.fullscan=true;
+    set odps.stage.mapper.split.size=256;
+    select * from dual;
+    '''
+    hints, sql = parse_hints(input_string)
+    assert hints == {'odps.sql.allow.fullscan': 'true', 'odps.stage.mapper.split.size': 256}
+    assert sql.strip() == "select * from dual;"
+    assert format_hints({'a': True, 'b': 256}) == {'a': 'true', 'b': '256'}
+
+
+def test_fingerprint():
+    times = {'p.s.a': datetime(2024, 1, 1), 'p.s.b': datetime(2024, 1, 2)}
+    assert fingerprint('select 1', times) == fingerprint(' select 1\n', dict(reversed(list(times.items()))))
+    assert fingerprint('select 1', times) != fingerprint('select 2', times)
+    assert fingerprint('select 1', times) != fingerprint('select 1', {**times, 'p.s.b': datetime(2024, 1, 3)})
+    config = {'partition_by': [{'field': 'ds', 'data_type': 'string'}], 'lifecycle': 7}
+    assert fingerprint('select 1', times, config) == fingerprint('select 1', times, dict(reversed(list(config.items()))))
+    assert fingerprint('select 1', times, config) != fingerprint('select 1', times, {**config, 'lifecycle': 30})
+
+
+def test_normalize_sql():
+    stored = "select id,\n  name from t"
+    compiled = "/* model comment */\nselect id,\n    name\nfrom t;\n"
+    assert normalize_sql(stored) == normalize_sql(compiled)
+    assert normalize_sql(stored) != normalize_sql("select id, name from t2")
+    assert normalize_sql(stored) == normalize_sql("set odps.sql.allow.fullscan=true;\n" + compiled)
+
+
+def test_is_select():
+    assert is_select(" select 1")
+    assert is_select("WITH a as (select 1) select * from a")
+    assert not is_select("show tables")
+    assert not is_select("insert overwrite table t select 1")
+    assert not is_select("with a as (select 1) insert into t select * from a")
+
+
+def test_main_statement():
+    assert main_statement(" select 1") == "select 1"
+    sql = "with a as (select '(' as x), `b` (y) as (select (1) from a) insert into t select * from b"
+    assert main_statement(sql) == "insert into t select * from b"
+    assert not is_query(sql)
+    assert is_query("with a as (select 1) select * from a")
+    # unbalanced, left as is
+    assert main_statement("with a as (select 1") == "with a as (select 1"
+
+
+def test_cluster_layout_matches():
+    layout = {'type': 'hash', 'columns': ['a'], 'sorted_by': [{'name': 'a', 'order': 'asc'}], 'buckets': 8}
+    assert cluster_layout_matches(dict(layout, columns=['A']), layout)
+    assert not cluster_layout_matches(dict(layout, buckets=16), layout)
+    assert not cluster_layout_matches(dict(layout, sorted_by=[{'name': 'a', 'order': 'desc'}]), layout)
+    assert not cluster_layout_matches(None, layout)
+    assert cluster_layout_matches(None, None)
+    ranged = dict(layout, type='range', buckets=None)
+    assert cluster_layout_matches(dict(ranged, buckets=1024), ranged)
+    assert not cluster_layout_matches(ranged, layout)